@@ -1,14 +1,21 @@
 import os
 from flask import Flask, render_template, request, redirect, session, url_for, send_file, jsonify, flash
-from utils.face_utils import recognize_face, generate_qr_code, validate_image
-from utils.attendance_utils import mark_attendance, get_attendance_report, get_attendance_statistics, \
-    get_student_attendance_history
+from utils.face_utils import recognize_face, recognize_faces, generate_qr_code, validate_image, get_model_info, \
+    read_upload, save_upload_image
+from utils.attendance_utils import mark_attendance_bulk, mark_attendance_bulk_by_id, \
+    get_attendance_report, \
+    get_attendance_statistics, get_student_attendance_history
 from utils.email_utils import send_absent_emails, send_registration_email
-from db_config import get_connection, init_database
-from train_model import train_face_model
+from db_config import get_connection, init_database, db_pool
+from utils.training_queue import training_queue
+from utils.attendance_coalescer import attendance_coalescer
+from utils.roster_cache import roster_cache
+from utils.model_registry import list_versions, rollback_model
+from utils.model_cache import get_shard_dir, MODEL_DIR
 from werkzeug.security import check_password_hash, generate_password_hash
 from datetime import datetime, timedelta
 import json
+import time
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -152,17 +159,11 @@ def register():
                     if img_data and img_data.startswith('data:image'):
                         # It's a base64 image
                         import base64
-                        import io
-                        from PIL import Image as PILImage
 
-                        # Extract base64 data
+                        # Extract base64 data and store it without re-encoding
                         header, encoded = img_data.split(',', 1)
                         img_bytes = base64.b64decode(encoded)
-                        img = PILImage.open(io.BytesIO(img_bytes))
-
-                        # Convert to grayscale and save
-                        img = img.convert('L')
-                        img.save(os.path.join(folder_path, f"face_{image_count}.jpg"))
+                        save_upload_image(img_bytes, os.path.join(folder_path, f"face_{image_count}.jpg"))
                         image_count += 1
 
             # If no base64 images, check for file uploads
@@ -171,12 +172,12 @@ def register():
                     if key.startswith('image_'):
                         img = request.files[key]
                         if img and img.filename:
-                            # Validate image
-                            is_valid, message = validate_image(img)
+                            # Read the upload once; validate from its header
+                            img_bytes = read_upload(img)
+                            is_valid, message = validate_image(img_bytes)
                             if is_valid:
-                                img.save(os.path.join(folder_path, f"face_{image_count}.jpg"))
+                                save_upload_image(img_bytes, os.path.join(folder_path, f"face_{image_count}.jpg"))
                                 image_count += 1
-                            img.seek(0)  # Reset file pointer
 
             if image_count == 0:
                 cursor.close()
@@ -194,21 +195,17 @@ def register():
                            VALUES (%s, %s, %s, %s, %s, %s, %s)
                            """, (name, roll, email, phone, department, folder_path, qr_path))
             conn.commit()
+            roster_cache.invalidate()
 
             print(f"✅ Student registered: {name} ({roll}) - {image_count} images captured")
 
             cursor.close()
             conn.close()
 
-            # Train model with new data
+            # Add the new student's faces to the model in the background
+            training_queue.submit_update(folder_path)
             training_success = True
-            training_message = "Model trained successfully"
-            try:
-                train_face_model()
-            except Exception as train_error:
-                print(f"⚠️ Model training warning: {train_error}")
-                training_success = False
-                training_message = f"Warning: Model training had issues - {str(train_error)}"
+            training_message = "Model training queued"
 
             # Send registration email
             try:
@@ -252,29 +249,34 @@ def recognize():
             return render_template('recognize.html', error='No image selected')
 
         try:
-            # Recognize face
-            result = recognize_face(image)
+            # Recognize face (searching the kiosk's department shard first, if given)
+            result = recognize_face(image, department=request.form.get('department'))
 
             if result['success']:
                 # Get student info
-                conn = get_connection()
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute("""
-                               SELECT id, name, roll_no, email, department
-                               FROM students
-                               WHERE id = %s
-                               """, (result['student_id'],))
-                student = cursor.fetchone()
+                entry = roster_cache.get_by_id(result['student_id'])
+                student = {key: getattr(entry, key) for key in ('id', 'name', 'roll_no', 'email', 'department')} \
+                    if entry else None
 
                 if student:
                     # Mark attendance
-                    attendance_marked = mark_attendance(student['roll_no'], method='Face',
+                    outcome = attendance_coalescer.mark(student['roll_no'], method='Face',
                                                         marked_by=session.get('user', 'System'))
 
-                    if attendance_marked:
+                    if outcome == 'marked':
                         result.update(student)
                         result['attendance_marked'] = True
                         flash(f'✅ Attendance marked for {student["name"]} ({student["roll_no"]})', 'success')
+                    elif outcome == 'error':
+                        result.update(student)
+                        result['attendance_marked'] = False
+                        result['success'] = False
+                        flash('❌ Attendance could not be saved. Please try again.', 'error')
+                    elif outcome == 'not_found':
+                        result.update(student)
+                        result['attendance_marked'] = False
+                        result['success'] = False
+                        flash(f'❌ Student {student["roll_no"]} was not found in the database', 'error')
                     else:
                         result.update(student)
                         result['attendance_marked'] = False
@@ -284,9 +286,6 @@ def recognize():
                 else:
                     flash('Student not found in database', 'error')
                     result['success'] = False
-
-                cursor.close()
-                conn.close()
             else:
                 flash(result.get('message', 'Face not recognized'), 'warning')
 
@@ -301,6 +300,102 @@ def recognize():
 
     return render_template('recognize.html')
 
+
+@app.route('/api/recognize', methods=['POST'])
+@login_required
+def api_recognize():
+    """
+    JSON recognition endpoint for the kiosk pages. Accepts a raw image body
+    (e.g. Content-Type: image/jpeg) or a multipart 'image' field, marks
+    attendance and returns a compact result with a timing breakdown.
+    """
+    started = time.perf_counter()
+    try:
+        if 'image' in request.files:
+            data = request.files['image'].read()
+        else:
+            data = request.get_data(cache=False)
+        if not data:
+            return jsonify({'success': False, 'message': 'No image uploaded'}), 400
+
+        timings = {}
+        department = request.args.get('department') or request.form.get('department')
+        result = recognize_face(data, department=department, timings=timings)
+
+        status_code = 200
+        response = {
+            'success': result['success'],
+            'message': result.get('message'),
+            'student_id': result.get('student_id'),
+            'confidence': result.get('confidence'),
+            'match_quality': result.get('match_quality'),
+            'rejected': result.get('rejected')
+        }
+
+        if result['success']:
+            start = time.perf_counter()
+            entry = roster_cache.get_by_id(result['student_id'])
+            timings['lookup_ms'] = round((time.perf_counter() - start) * 1000, 2)
+
+            if entry:
+                student = {'name': entry.name, 'roll_no': entry.roll_no, 'department': entry.department}
+                start = time.perf_counter()
+                outcome = attendance_coalescer.mark(student['roll_no'], method='Face',
+                                                    marked_by=session.get('user', 'System'))
+                timings['mark_ms'] = round((time.perf_counter() - start) * 1000, 2)
+                response.update(student)
+                response['attendance_marked'] = outcome == 'marked'
+                response['already_marked'] = outcome == 'already_marked'
+                if outcome == 'error':
+                    # The mark was rolled back; tell the kiosk to retry rather than "already marked"
+                    response['success'] = False
+                    response['attendance_error'] = True
+                    response['message'] = 'Attendance could not be saved, please try again'
+                    status_code = 503
+                elif outcome == 'not_found':
+                    response['success'] = False
+                    response['message'] = 'Student not found in database'
+            else:
+                response['success'] = False
+                response['message'] = 'Student not found in database'
+
+        timings['total_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        response['timings'] = timings
+        return jsonify(response), status_code
+
+    except Exception as e:
+        print(f"Error in API recognition: {e}")
+        return jsonify({'success': False, 'message': f'Recognition failed: {str(e)}'}), 500
+
+@app.route('/api/recognize_group', methods=['POST'])
+@login_required
+def recognize_group():
+    """API endpoint to mark attendance for every recognized face in one classroom photo"""
+    if 'image' not in request.files or request.files['image'].filename == '':
+        return jsonify({'success': False, 'message': 'No image uploaded'}), 400
+
+    try:
+        result = recognize_faces(request.files['image'], department=request.form.get('department'))
+
+        student_ids = [face['student_id'] for face in result['faces'] if face['recognized']]
+        outcomes = mark_attendance_bulk_by_id(student_ids, method='Face',
+                                              marked_by=session.get('user', 'System'))
+
+        for face in result['faces']:
+            if face['recognized']:
+                face.update(outcomes.get(face['student_id'], {'status': 'not_found'}))
+
+        result['marked'] = sum(1 for o in outcomes.values() if o['status'] == 'marked')
+        result['already_marked'] = sum(1 for o in outcomes.values() if o['status'] == 'already_marked')
+        return jsonify(result)
+
+    except Exception as e:
+        print(f"Error in group recognition: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': f'Recognition failed: {str(e)}'}), 500
+
+
 @app.route('/analytics')
 @login_required
 def analytics():
@@ -362,25 +457,17 @@ def student_panel():
 @app.route('/api/student/<roll_no>')
 def get_student_info(roll_no):
     """API endpoint to get student information"""
-    conn = None
-    cursor = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-                       SELECT id, name, roll_no, email, phone, department, created_at
-                       FROM students
-                       WHERE roll_no = %s
-                       """, (roll_no,))
-        student = cursor.fetchone()
-
-        if student:
+        entry = roster_cache.get_by_roll(roll_no)
+
+        if entry:
+            student = entry._asdict()
             # Convert datetime to string for JSON serialization
-            if 'created_at' in student and student['created_at']:
+            if student['created_at']:
                 student['created_at'] = student['created_at'].strftime('%Y-%m-%d %H:%M:%S')
 
             # Get attendance history
-            history = get_student_attendance_history(roll_no)
+            history = get_student_attendance_history(entry.roll_no)
 
             # Convert history tuples to serializable format
             serialized_history = []
@@ -394,30 +481,14 @@ def get_student_info(roll_no):
 
             student['attendance_history'] = serialized_history
 
-            cursor.close()
-            conn.close()
-
             return jsonify({'success': True, 'data': student})
         else:
-            cursor.close()
-            conn.close()
             return jsonify({'success': False, 'message': 'Student not found'}), 404
     except Exception as e:
         print(f"❌ Error in get_student_info for roll_no {roll_no}: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'message': str(e)}), 500
-    finally:
-        if cursor:
-            try:
-                cursor.close()
-            except:
-                pass
-        if conn:
-            try:
-                conn.close()
-            except:
-                pass
 
 
 @app.route('/api/stats')
@@ -431,6 +502,39 @@ def get_stats():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@app.route('/api/model/status')
+@login_required
+def model_status():
+    """API endpoint for the cached recognition model (version, load time)"""
+    return jsonify({'success': True, 'data': get_model_info()})
+
+
+@app.route('/api/model/versions')
+@login_required
+def model_versions():
+    """API endpoint listing the versions in the model registry (optionally of a department shard)"""
+    department = request.args.get('department')
+    try:
+        model_dir = get_shard_dir(department) if department else MODEL_DIR
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'data': list_versions(model_dir)})
+
+
+@app.route('/api/model/rollback', methods=['POST'])
+@login_required
+def model_rollback():
+    """API endpoint to make an earlier model version current; recognizers swap to it on the next request"""
+    data = request.get_json(silent=True) or request.form
+    department = data.get('department')
+    try:
+        model_dir = get_shard_dir(department) if department else MODEL_DIR
+        version = rollback_model(model_dir, data.get('version'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'message': f'Model rolled back to version {version}', 'version': version})
+
+
 @app.route('/api/mark_attendance_qr', methods=['POST'])
 def mark_attendance_qr():
     """API endpoint for QR code attendance marking"""
@@ -442,28 +546,81 @@ def mark_attendance_qr():
         if not roll_no:
             return jsonify({'success': False, 'message': 'Invalid QR code'}), 400
 
-        success = mark_attendance(roll_no, method='QR', marked_by='Self')
+        outcome = attendance_coalescer.mark(roll_no, method='QR', marked_by='Self')
 
-        if success:
+        if outcome == 'marked':
             return jsonify({'success': True, 'message': 'Attendance marked successfully'})
+        elif outcome == 'error':
+            return jsonify({'success': False, 'message': 'Attendance could not be saved, please try again'}), 503
         else:
             return jsonify({'success': False, 'message': 'Attendance already marked or student not found'}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@app.route('/api/attendance/bulk', methods=['POST'])
+@login_required
+def mark_attendance_bulk_api():
+    """
+    API endpoint to mark many students at once.
+    Body: {"roll_nos": [...], "method": "Manual"}; returns the outcome per roll number.
+    """
+    data = request.get_json(silent=True) or {}
+    roll_nos = data.get('roll_nos')
+    if not isinstance(roll_nos, list) or not roll_nos:
+        return jsonify({'success': False, 'message': 'roll_nos must be a non-empty list'}), 400
+    method = data.get('method', 'Manual')
+    if not isinstance(method, str) or not 0 < len(method) <= 20:  # attendance.method is VARCHAR(20)
+        return jsonify({'success': False, 'message': 'method must be 1-20 characters'}), 400
+
+    try:
+        results = mark_attendance_bulk(roll_nos, method=method, marked_by=session.get('user', 'System'))
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+    summary = {'marked': 0, 'already_marked': 0, 'not_found': 0}
+    for outcome in results.values():
+        summary[outcome['status']] += 1
+    return jsonify({'success': True, 'summary': summary, 'results': results})
+
+
 @app.route('/train_model')
 @login_required
 def train_model_route():
     """Endpoint to manually trigger model training"""
-    try:
-        train_face_model()
-        flash('Face recognition model trained successfully', 'success')
-    except Exception as e:
-        flash(f'Model training failed: {str(e)}', 'error')
+    training_queue.submit_full()
+    flash('Face recognition model training started in the background', 'success')
     return redirect(url_for('dashboard'))
 
 
+@app.route('/api/training/status')
+@login_required
+def training_status():
+    """API endpoint for the background training queue"""
+    return jsonify({'success': True, 'data': training_queue.status()})
+
+
+@app.route('/api/attendance/coalescer')
+@login_required
+def attendance_coalescer_status():
+    """API endpoint for the attendance write coalescer (flush sizes and latencies)"""
+    return jsonify({'success': True, 'data': attendance_coalescer.stats()})
+
+
+@app.route('/api/roster/status')
+@login_required
+def roster_status():
+    """API endpoint for the in-memory student roster (size, generation, hit counts)"""
+    return jsonify({'success': True, 'data': roster_cache.stats()})
+
+
+@app.route('/api/db/pool')
+@login_required
+def db_pool_status():
+    """API endpoint for database connection pool usage (waits, exhaustions, peak connections)"""
+    return jsonify({'success': True, 'data': db_pool.stats()})
+
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
@@ -0,0 +1,136 @@
+"""
+Compare marks per second of the previous four-round-trip mark_attendance
+(SELECT student, SELECT attendance, INSERT attendance, INSERT log) with the
+current version (roster lookup, INSERT ... ON DUPLICATE KEY UPDATE, INSERT
+log), against the configured MySQL,
+plus the time mark_attendance_bulk takes for the whole roster at once.
+
+Usage (from the project root, with DB_* pointing at a local test database):
+    python -m benchmarks.attendance_benchmark --students 500 --threads 1 4
+
+Creates temporary students with roll numbers BENCH-00001... and deletes
+them (and, by cascade, their attendance) when done. Each run measures new
+marks first and then repeat scans of already-marked students.
+"""
+import argparse
+import contextlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from db_config import get_connection
+from utils.attendance_utils import mark_attendance, mark_attendance_bulk, get_attendance_status
+
+ROLL_PREFIX = 'BENCH-'
+
+
+def legacy_mark_attendance(roll_no, method='Face', marked_by='System'):
+    """The previous implementation: four statements per mark"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        date_today = datetime.now().date()
+        time_now = datetime.now().time()
+        cursor.execute("SELECT id, name FROM students WHERE roll_no = %s", (roll_no,))
+        student = cursor.fetchone()
+        if not student:
+            return False
+        cursor.execute("SELECT * FROM attendance WHERE student_id = %s AND date = %s", (student[0], date_today))
+        if cursor.fetchone():
+            return False
+        status = get_attendance_status(time_now)
+        cursor.execute("""
+                       INSERT INTO attendance (student_id, date, time, status, marked_by, method)
+                       VALUES (%s, %s, %s, %s, %s, %s)
+                       """, (student[0], date_today, time_now, status, marked_by, method))
+        cursor.execute("INSERT INTO attendance_logs (student_id, action) VALUES (%s, %s)",
+                       (student[0], f"Attendance marked: {status} via {method}"))
+        conn.commit()
+        return True
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def execute(sql, params=(), many=False):
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if many:
+            cursor.executemany(sql, params)
+        else:
+            cursor.execute(sql, params)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def create_students(count):
+    rolls = [f"{ROLL_PREFIX}{i:05d}" for i in range(1, count + 1)]
+    execute("INSERT INTO students (name, roll_no, email) VALUES (%s, %s, %s)",
+            [(f"Bench Student {roll}", roll, f"{roll.lower()}@example.com") for roll in rolls], many=True)
+    return rolls
+
+
+def reset_attendance():
+    execute("""
+            DELETE a FROM attendance a JOIN students s ON s.id = a.student_id
+            WHERE s.roll_no LIKE %s AND a.date = CURDATE()
+            """, (f"{ROLL_PREFIX}%",))
+
+
+def delete_students():
+    execute("DELETE FROM attendance_logs WHERE student_id IN (SELECT id FROM students WHERE roll_no LIKE %s)",
+            (f"{ROLL_PREFIX}%",))
+    execute("DELETE FROM students WHERE roll_no LIKE %s", (f"{ROLL_PREFIX}%",))
+
+
+def run(mark, rolls, threads):
+    """Mark every roll number; returns (marks per second, number marked)"""
+    # The implementations print a line per mark; keep them out of the timing
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        if threads == 1:
+            results = [mark(roll) for roll in rolls]
+        else:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                results = list(executor.map(mark, rolls))
+        elapsed = time.perf_counter() - start
+    return len(rolls) / elapsed, sum(1 for r in results if r)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="mark_attendance throughput, before vs after")
+    parser.add_argument('--students', type=int, default=300)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1],
+                        help="Concurrent callers (keep within the connection pool size)")
+    args = parser.parse_args()
+
+    delete_students()
+    rolls = create_students(args.students)
+    try:
+        print(f"{args.students} students\n")
+        print(f"{'implementation':>15} {'threads':>8} {'new marks/s':>12} {'repeat marks/s':>15}")
+        for threads in args.threads:
+            for name, mark in (('legacy', legacy_mark_attendance), ('on-duplicate', mark_attendance)):
+                reset_attendance()
+                new_rate, marked = run(mark, rolls, threads)
+                repeat_rate, remarked = run(mark, rolls, threads)
+                if marked != len(rolls) or remarked:
+                    print(f"⚠️ {name}: expected {len(rolls)} new and 0 repeat marks, got {marked} and {remarked}")
+                print(f"{name:>15} {threads:8d} {new_rate:12.1f} {repeat_rate:15.1f}")
+
+        reset_attendance()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            outcomes = mark_attendance_bulk(rolls)
+            elapsed = time.perf_counter() - start
+        marked = sum(1 for outcome in outcomes.values() if outcome['status'] == 'marked')
+        print(f"\nmark_attendance_bulk: {marked} of {len(rolls)} marked in {elapsed * 1000:.0f} ms")
+    finally:
+        delete_students()
+
+
+if __name__ == "__main__":
+    main()
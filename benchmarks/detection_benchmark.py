@@ -0,0 +1,81 @@
+"""
+Benchmark downscaled face detection against full-resolution detection.
+Full-resolution boxes are the reference, so "agree" also counts any false
+positives the full-resolution scan produces; check those by eye.
+
+Usage (from the project root):
+    python -m benchmarks.detection_benchmark --images student_images --max-side 640 480 320
+"""
+import argparse
+import os
+import time
+import cv2
+import numpy as np
+from utils.face_utils import detect_faces
+from utils.face_tracker import box_iou
+
+
+def find_images(root):
+    """Collect image paths below root, skipping generated QR codes"""
+    paths = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if filename == 'qr_code.png':
+                continue
+            if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+                paths.append(os.path.join(dirpath, filename))
+    return paths
+
+
+def run_mode(images, max_side, repeat):
+    """Time detect_faces over all images; returns (latencies in ms, boxes per image)"""
+    latencies = []
+    boxes = []
+    for img in images:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            faces = detect_faces(img, max_side=max_side)
+            latencies.append((time.perf_counter() - start) * 1000)
+        boxes.append([tuple(int(v) for v in f) for f in faces])
+    return latencies, boxes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark downscaled Haar detection")
+    parser.add_argument('--images', default='student_images', help="Folder of test images (searched recursively)")
+    parser.add_argument('--max-side', type=int, nargs='+', default=[1280, 960, 640, 480, 320],
+                        help="Working resolutions to compare against full resolution")
+    parser.add_argument('--repeat', type=int, default=3, help="Detections per image per mode")
+    parser.add_argument('--limit', type=int, default=200, help="Maximum number of images to use")
+    args = parser.parse_args()
+
+    paths = find_images(args.images)[:args.limit]
+    images = [img for img in (cv2.imread(p, cv2.IMREAD_GRAYSCALE) for p in paths) if img is not None]
+    if not images:
+        print(f"❌ No images found under {args.images}")
+        return
+
+    print(f"📊 {len(images)} images, median size "
+          f"{int(np.median([i.shape[1] for i in images]))}x{int(np.median([i.shape[0] for i in images]))}")
+
+    base_latencies, base_boxes = run_mode(images, 0, args.repeat)
+    base_count = sum(len(b) for b in base_boxes)
+    print(f"{'mode':>12} {'mean ms':>9} {'p95 ms':>9} {'faces':>7} {'agree':>8} {'speedup':>8}")
+    print(f"{'full':>12} {np.mean(base_latencies):9.2f} {np.percentile(base_latencies, 95):9.2f} "
+          f"{base_count:7d} {'-':>8} {'1.00x':>8}")
+
+    for max_side in args.max_side:
+        latencies, boxes = run_mode(images, max_side, args.repeat)
+        # Share of full-resolution boxes also found (IoU >= 0.5) in this mode
+        matched = sum(
+            1 for ref, found in zip(base_boxes, boxes)
+            for box in ref if any(box_iou(box, other) >= 0.5 for other in found)
+        )
+        agree = matched / base_count if base_count else 1.0
+        print(f"{max_side:>12} {np.mean(latencies):9.2f} {np.percentile(latencies, 95):9.2f} "
+              f"{sum(len(b) for b in boxes):7d} {agree:8.2%} "
+              f"{np.mean(base_latencies) / np.mean(latencies):7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
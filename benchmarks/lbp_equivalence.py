@@ -0,0 +1,91 @@
+"""
+Check that the NumPy LBPH engine matches OpenCV's LBPHFaceRecognizer and
+compare their prediction speed.
+
+Usage (from the project root):
+    python -m benchmarks.lbp_equivalence --students 50 --images 10 --queries 100
+
+Exits with status 1 if histograms, labels or distances disagree.
+"""
+import argparse
+import sys
+import time
+import cv2
+import numpy as np
+from utils.face_utils import preprocess_face
+from utils.lbp_engine import NumpyLBPHRecognizer
+
+
+def synthetic_faces(students, images, seed=0):
+    """Random textured 200x200 'faces' with small per-image variations"""
+    rng = np.random.default_rng(seed)
+    faces = []
+    labels = []
+    for student in range(students):
+        base = rng.integers(0, 256, (200, 200), dtype=np.uint8)
+        for _ in range(images):
+            noisy = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+            faces.append(preprocess_face(noisy))
+            labels.append(student)
+    return faces, np.array(labels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NumPy vs OpenCV LBPH equivalence check")
+    parser.add_argument('--students', type=int, default=50)
+    parser.add_argument('--images', type=int, default=10, help="Training images per student")
+    parser.add_argument('--queries', type=int, default=100)
+    args = parser.parse_args()
+
+    faces, labels = synthetic_faces(args.students, args.images)
+    queries, _ = synthetic_faces(args.students, max(1, args.queries // args.students), seed=1)
+    queries = queries[:args.queries]
+
+    cv_model = cv2.face.LBPHFaceRecognizer_create()
+    np_model = NumpyLBPHRecognizer()
+
+    start = time.perf_counter()
+    cv_model.train(faces, labels)
+    cv_train = time.perf_counter() - start
+    start = time.perf_counter()
+    np_model.train(faces, labels)
+    np_train = time.perf_counter() - start
+
+    ok = True
+    cv_hists = np.array(cv_model.getHistograms()).reshape(len(faces), -1)
+    hist_diff = np.abs(cv_hists - np_model.histograms).max()
+    print(f"Histogram max abs difference: {hist_diff:.3g}")
+    if hist_diff > 1e-6:
+        ok = False
+
+    start = time.perf_counter()
+    cv_preds = [cv_model.predict(q) for q in queries]
+    cv_predict = time.perf_counter() - start
+    start = time.perf_counter()
+    np_single = [np_model.predict(q) for q in queries]
+    np_predict = time.perf_counter() - start
+    start = time.perf_counter()
+    np_labels, np_dists = np_model.predict_batch(queries)
+    np_batch = time.perf_counter() - start
+
+    label_mismatches = sum(1 for (cl, _), nl in zip(cv_preds, np_labels) if cl != nl)
+    dist_diff = max(abs(cd - nd) / max(cd, 1e-12) for (_, cd), nd in zip(cv_preds, np_dists))
+    single_mismatches = sum(1 for a, b in zip(np_single, zip(np_labels, np_dists)) if a[0] != b[0])
+    print(f"Label mismatches: {label_mismatches} / {len(queries)} "
+          f"(single vs batch: {single_mismatches}); max relative distance difference: {dist_diff:.3g}")
+    if label_mismatches or single_mismatches or dist_diff > 1e-5:
+        ok = False
+
+    print(f"\n{len(faces)} training images, {len(queries)} queries")
+    print(f"{'':>16} {'OpenCV':>10} {'NumPy':>10}")
+    print(f"{'train s':>16} {cv_train:10.3f} {np_train:10.3f}")
+    print(f"{'predict ms/face':>16} {cv_predict / len(queries) * 1000:10.2f} "
+          f"{np_predict / len(queries) * 1000:10.2f}")
+    print(f"{'batch ms/face':>16} {'-':>10} {np_batch / len(queries) * 1000:10.2f}")
+
+    print("\n✅ NumPy engine matches OpenCV" if ok else "\n❌ NumPy engine differs from OpenCV")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Compare model size, load time and resident memory of the OpenCV YAML model
+against the compact .lbph format at each storage dtype.
+
+Usage (from the project root):
+    python -m benchmarks.model_format_benchmark --students 100 --images 10
+
+Each load runs in a fresh process so memory numbers are not polluted.
+Resident memory is read from /proc and is only reported on Linux.
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import cv2
+import numpy as np
+from benchmarks.lbp_equivalence import synthetic_faces
+from utils.lbp_engine import NumpyLBPHRecognizer
+
+
+def rss_mb():
+    """Resident set size of this process in MB, or None if unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _load_and_predict(kind, path, queries, result_queue):
+    """Child process: load a model, run the queries, report timings and memory"""
+    before = rss_mb()
+    start = time.perf_counter()
+    if kind == 'yaml':
+        model = cv2.face.LBPHFaceRecognizer_create()
+        model.read(path)
+    else:
+        model = NumpyLBPHRecognizer()
+        model.read(path, mmap=(kind == 'lbph-mmap'))
+    load_seconds = time.perf_counter() - start
+    after_load = rss_mb()
+
+    start = time.perf_counter()
+    predictions = [model.predict(q) for q in queries]
+    predict_ms = (time.perf_counter() - start) / len(queries) * 1000
+    after_predict = rss_mb()
+
+    result_queue.put({
+        'load_seconds': load_seconds,
+        'load_rss_mb': None if before is None else after_load - before,
+        'predict_rss_mb': None if before is None else after_predict - before,
+        'predict_ms': predict_ms,
+        'labels': [int(label) for label, _ in predictions],
+    })
+
+
+def measure(kind, path, queries):
+    ctx = multiprocessing.get_context('spawn')
+    result_queue = ctx.Queue()
+    process = ctx.Process(target=_load_and_predict, args=(kind, path, queries, result_queue))
+    process.start()
+    result = result_queue.get()
+    process.join()
+    return result
+
+
+def fmt(value, pattern):
+    return '-' if value is None else pattern.format(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YAML vs .lbph model format benchmark")
+    parser.add_argument('--students', type=int, default=100)
+    parser.add_argument('--images', type=int, default=10, help="Training images per student")
+    parser.add_argument('--queries', type=int, default=20)
+    args = parser.parse_args()
+
+    faces, labels = synthetic_faces(args.students, args.images)
+    queries, _ = synthetic_faces(args.students, 1, seed=1)
+    queries = queries[:args.queries]
+
+    workdir = tempfile.mkdtemp(prefix='lbph_bench_')
+    rows = []
+
+    yaml_path = os.path.join(workdir, 'trainer.yml')
+    cv_model = cv2.face.LBPHFaceRecognizer_create()
+    cv_model.train(faces, labels)
+    start = time.perf_counter()
+    cv_model.save(yaml_path)
+    rows.append(('yaml', yaml_path, time.perf_counter() - start))
+
+    np_model = NumpyLBPHRecognizer()
+    np_model.train(faces, labels)
+    for dtype_name in ('float32', 'float16', 'uint8'):
+        path = os.path.join(workdir, f'trainer_{dtype_name}.lbph')
+        start = time.perf_counter()
+        np_model.save(path, dtype_name)
+        rows.append((f'lbph-{dtype_name}', path, time.perf_counter() - start))
+
+    print(f"{len(faces)} training images ({args.students} students x {args.images}), {len(queries)} queries\n")
+    print(f"{'format':>17} {'size MB':>9} {'save s':>8} {'load s':>8} {'load RSS':>9} "
+          f"{'pred RSS':>9} {'ms/pred':>8} {'agree':>7}")
+
+    reference = None
+    for name, path, save_seconds in rows:
+        kinds = ['yaml'] if name == 'yaml' else ['lbph-mmap', 'lbph-ram']
+        for kind in kinds:
+            result = measure(kind, path, queries)
+            if reference is None:
+                reference = result['labels']
+            agree = np.mean([a == b for a, b in zip(reference, result['labels'])])
+            label = name if kind == 'yaml' else f"{name}{'' if kind == 'lbph-mmap' else ' ram'}"
+            print(f"{label:>17} {os.path.getsize(path) / 1024 / 1024:9.1f} {save_seconds:8.3f} "
+                  f"{result['load_seconds']:8.3f} {fmt(result['load_rss_mb'], '{:8.1f}M')} "
+                  f"{fmt(result['predict_rss_mb'], '{:8.1f}M')} {result['predict_ms']:8.2f} {agree:7.1%}")
+
+    for _, path, _ in rows:
+        os.remove(path)
+    os.rmdir(workdir)
+
+
+if __name__ == "__main__":
+    main()
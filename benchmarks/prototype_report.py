@@ -0,0 +1,72 @@
+"""
+Accuracy and speed of prototype condensation at different settings of
+FACE_PROTOTYPES_PER_STUDENT, measured on a held-out split.
+
+Usage (from the project root):
+    python -m benchmarks.prototype_report                      # enrolled students
+    python -m benchmarks.prototype_report --synthetic 50 20    # synthetic roster
+
+Every --holdout-th image of each student is held out for testing; the
+remaining images are condensed and trained with the NumPy engine, which
+gives the same predictions as OpenCV.
+"""
+import argparse
+import os
+import time
+import numpy as np
+from benchmarks.lbp_equivalence import synthetic_faces
+from train_model import DATA_DIR, load_training_set
+from utils.lbp_engine import NumpyLBPHRecognizer
+from utils.prototypes import select_prototypes
+
+
+def split(faces, labels, holdout):
+    """Hold out every holdout-th image of each student"""
+    labels = np.asarray(labels)
+    train_idx, test_idx = [], []
+    for label in np.unique(labels):
+        for position, idx in enumerate(np.flatnonzero(labels == label)):
+            (test_idx if position % holdout == holdout - 1 else train_idx).append(idx)
+    return ([faces[i] for i in train_idx], labels[train_idx],
+            [faces[i] for i in test_idx], labels[test_idx])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prototype condensation accuracy report")
+    parser.add_argument('--synthetic', type=int, nargs=2, metavar=('STUDENTS', 'IMAGES'),
+                        help="Use a synthetic roster instead of student_images")
+    parser.add_argument('--prototypes', type=int, nargs='+', default=[1, 2, 3, 5, 8, 0],
+                        help="Prototypes per student to evaluate (0 = keep all)")
+    parser.add_argument('--holdout', type=int, default=5, help="Hold out every Nth image")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        faces, labels = synthetic_faces(*args.synthetic)
+    else:
+        folders = [os.path.join(DATA_DIR, name) for name in sorted(os.listdir(DATA_DIR))]
+        faces, labels = load_training_set([f for f in folders if os.path.isdir(f)])
+
+    train_faces, train_labels, test_faces, test_labels = split(faces, labels, args.holdout)
+    if not test_faces:
+        print("❌ Not enough images per student for a held-out split")
+        return
+    print(f"{len(set(train_labels.tolist()))} students, {len(train_faces)} training / "
+          f"{len(test_faces)} held-out images\n")
+    print(f"{'per student':>12} {'stored':>8} {'accuracy':>9} {'ms/face':>8}")
+
+    for per_student in args.prototypes:
+        faces_k, labels_k = select_prototypes(train_faces, train_labels, per_student)
+        model = NumpyLBPHRecognizer()
+        model.train(faces_k, labels_k)
+
+        start = time.perf_counter()
+        predicted, _ = model.predict_batch(test_faces)
+        ms_per_face = (time.perf_counter() - start) / len(test_faces) * 1000
+
+        accuracy = float(np.mean(predicted == test_labels))
+        name = 'all' if per_student <= 0 else str(per_student)
+        print(f"{name:>12} {len(faces_k):8d} {accuracy:9.2%} {ms_per_face:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Recognition benchmark suite on a synthetic roster of N students x M images.
+Times detection, preprocessing, training (cold and with the face cache warm),
+model load, single predictions, end-to-end recognize_face and batch
+prediction, reporting p50/p95 latency and peak memory per stage as JSON.
+
+Usage (from the project root):
+    python -m benchmarks.recognition_suite --students 100 --images 10 --output bench.json
+    python -m benchmarks.recognition_suite --backend numpy --students 500 --images 5
+
+The dataset is drawn locally (simple cartoon faces the Haar cascade
+detects), so results are reproducible across machines and releases.
+Every stage runs in a fresh process so its peak memory is its own; peak
+memory comes from getrusage and is reported as null on Windows.
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+
+STAGES = ['detect', 'preprocess', 'train_cold', 'train_warm', 'load',
+          'predict_single', 'recognize_face', 'predict_batch']
+
+
+def synthetic_face(student, image, size=240):
+    """
+    Grayscale cartoon face: geometry and skin texture are fixed per student,
+    pose, scale and noise vary per image.
+    """
+    rng = np.random.default_rng(student)
+    skin = int(rng.integers(150, 210))
+    background = int(rng.integers(60, 120))
+    eye_dx = int(rng.integers(28, 40))
+    eye_y = int(rng.integers(98, 112))
+    mouth_w = int(rng.integers(20, 36))
+    nose = int(rng.integers(-8, 9))
+    texture = cv2.GaussianBlur(rng.normal(0, 60, (240, 240)), (0, 0), 1.5)
+
+    img = np.full((240, 240), background, np.float64)
+    cv2.ellipse(img, (120, 125), (78, 100), 0, 0, 360, skin, -1)
+    img += texture * (img == skin)
+    for ex in (120 - eye_dx, 120 + eye_dx):
+        cv2.ellipse(img, (ex, eye_y), (16, 8), 0, 0, 360, 30, -1)
+        cv2.ellipse(img, (ex, eye_y - 18), (20, 5), 0, 180, 360, 50, -1)
+    cv2.line(img, (120, eye_y + 5), (120 + nose, eye_y + 45), skin - 60, 4)
+    cv2.ellipse(img, (120, eye_y + 72), (mouth_w, 9), 0, 0, 180, 60, -1)
+
+    variation = np.random.default_rng(student * 100003 + image + 1)
+    matrix = cv2.getRotationMatrix2D((120, 120), variation.normal(0, 3), 1 + variation.normal(0, 0.03))
+    matrix[:, 2] += variation.normal(0, 3, 2)
+    img = cv2.warpAffine(img, matrix, (240, 240), borderMode=cv2.BORDER_REPLICATE)
+    img = cv2.GaussianBlur(img, (0, 0), 2) + variation.normal(0, 5, img.shape)
+    img = np.clip(img, 0, 255).astype(np.uint8)
+    return img if size == 240 else cv2.resize(img, (size, size))
+
+
+def query_frame(student, seed, frame_size=(480, 640)):
+    """A camera-sized frame with one face of the student at a random position"""
+    rng = np.random.default_rng(seed)
+    frame = cv2.GaussianBlur(rng.integers(40, 160, frame_size).astype(np.uint8), (0, 0), 8)
+    face = synthetic_face(student, 10000 + seed, size=int(rng.integers(160, 240)))
+    y = int(rng.integers(0, frame_size[0] - face.shape[0]))
+    x = int(rng.integers(0, frame_size[1] - face.shape[1]))
+    frame[y:y + face.shape[0], x:x + face.shape[1]] = face
+    return frame
+
+
+def build_dataset(workdir, students, images, queries):
+    """Write student_images/student_<n>/face_<m>.jpg and query frames under workdir"""
+    start = time.perf_counter()
+    for student in range(1, students + 1):
+        folder = os.path.join(workdir, 'student_images', f'student_{student}')
+        os.makedirs(folder, exist_ok=True)
+        for image in range(images):
+            cv2.imwrite(os.path.join(folder, f'face_{image}.jpg'), synthetic_face(student, image))
+
+    query_dir = os.path.join(workdir, 'queries')
+    os.makedirs(query_dir, exist_ok=True)
+    for q in range(queries):
+        student = q % students + 1
+        cv2.imwrite(os.path.join(query_dir, f'{q:05d}_{student}.jpg'), query_frame(student, q))
+    return time.perf_counter() - start
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unavailable"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def load_queries(query_dir):
+    """Return list of (expected student id, JPEG bytes, grayscale frame)"""
+    queries = []
+    for name in sorted(os.listdir(query_dir)):
+        path = os.path.join(query_dir, name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        expected = int(name.rsplit('_', 1)[1].split('.')[0])
+        queries.append((expected, data, cv2.imread(path, cv2.IMREAD_GRAYSCALE)))
+    return queries
+
+
+def query_crops(queries):
+    """Preprocessed face crop (and expected id) for every query with a detected face"""
+    from utils.face_utils import detect_faces, preprocess_face
+    crops, expected = [], []
+    for student, _, gray in queries:
+        faces = detect_faces(gray)
+        if len(faces):
+            x, y, w, h = faces[0]
+            crops.append(preprocess_face(gray[y:y + h, x:x + w]))
+            expected.append(student)
+    return crops, expected
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def run_stage(stage, workdir, repeat, batch_size):
+    """Run one stage in the current process; returns (latencies in ms, extra fields)"""
+    os.chdir(workdir)
+    from utils.face_utils import detect_faces, preprocess_face, recognize_face, predict_crops
+    from utils.model_cache import RecognizerCache
+    import train_model
+
+    queries = load_queries('queries')
+    latencies, extra = [], {}
+
+    if stage == 'detect':
+        for _ in range(repeat):
+            for _, _, gray in queries:
+                latencies.append(timed(detect_faces, gray)[0])
+        extra['detection_rate'] = float(np.mean([len(detect_faces(gray)) > 0 for _, _, gray in queries]))
+
+    elif stage == 'preprocess':
+        raw = []
+        for _, _, gray in queries:
+            faces = detect_faces(gray)
+            if len(faces):
+                x, y, w, h = faces[0]
+                raw.append(gray[y:y + h, x:x + w])
+        for _ in range(repeat):
+            latencies.extend(timed(preprocess_face, face)[0] for face in raw)
+
+    elif stage == 'train_cold':
+        shutil.rmtree('recognizer', ignore_errors=True)
+        latencies.append(timed(train_model.train_face_model)[0])
+
+    elif stage == 'train_warm':
+        for _ in range(repeat):
+            latencies.append(timed(train_model.train_face_model)[0])
+
+    elif stage == 'load':
+        for _ in range(repeat):
+            latencies.append(timed(RecognizerCache().get)[0])
+        extra['model_bytes'] = os.path.getsize(RecognizerCache().model_path)
+
+    elif stage == 'predict_single':
+        recognizer = RecognizerCache().get()
+        crops, expected = query_crops(queries)
+        predictions = []
+        for _ in range(repeat):
+            for crop in crops:
+                elapsed, prediction = timed(recognizer.predict, crop)
+                latencies.append(elapsed)
+                predictions.append(prediction[0])
+        extra['accuracy'] = float(np.mean([p == e for p, e in zip(predictions, expected * repeat)]))
+
+    elif stage == 'recognize_face':
+        recognize_face(io.BytesIO(queries[0][1]))  # load the shared model outside the timings
+        correct = 0
+        for _ in range(repeat):
+            for student, data, _ in queries:
+                elapsed, result = timed(recognize_face, io.BytesIO(data))
+                latencies.append(elapsed)
+                correct += result.get('student_id') == student
+        extra['accuracy'] = correct / (len(queries) * repeat)
+
+    elif stage == 'predict_batch':
+        recognizer = RecognizerCache().get()
+        crops, _ = query_crops(queries)
+        for _ in range(repeat):
+            for i in range(0, len(crops), batch_size):
+                batch = crops[i:i + batch_size]
+                elapsed, _ = timed(predict_crops, recognizer, batch)
+                latencies.append(elapsed / len(batch))
+        extra['batch_size'] = batch_size
+        extra['unit'] = 'ms per face'
+
+    return latencies, extra
+
+
+def _stage_process(stage, workdir, repeat, batch_size, result_queue):
+    """Child process: run one stage and report its statistics"""
+    # Keep the training and recognition log lines out of the JSON on stdout
+    sys.stdout = open(os.devnull, 'w', encoding='utf-8')
+    baseline = peak_rss_mb()
+    latencies, extra = run_stage(stage, workdir, repeat, batch_size)
+    peak = peak_rss_mb()
+    result_queue.put({
+        'count': len(latencies),
+        'p50_ms': float(np.percentile(latencies, 50)) if latencies else None,
+        'p95_ms': float(np.percentile(latencies, 95)) if latencies else None,
+        'mean_ms': float(np.mean(latencies)) if latencies else None,
+        'peak_rss_mb': peak,
+        'stage_rss_mb': None if peak is None else peak - baseline,
+        **extra
+    })
+
+
+def measure(stage, workdir, repeat, batch_size):
+    ctx = multiprocessing.get_context('spawn')
+    result_queue = ctx.Queue()
+    process = ctx.Process(target=_stage_process, args=(stage, workdir, repeat, batch_size, result_queue))
+    process.start()
+    result = result_queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic-roster recognition benchmark suite")
+    parser.add_argument('--students', type=int, default=50)
+    parser.add_argument('--images', type=int, default=10, help="Training images per student")
+    parser.add_argument('--queries', type=int, default=100, help="Query frames (one face each)")
+    parser.add_argument('--repeat', type=int, default=3, help="Repetitions of each timed stage")
+    parser.add_argument('--batch-size', type=int, default=16, help="Faces per batch prediction")
+    parser.add_argument('--backend', choices=['opencv', 'numpy'], help="Recognition backend (default: Config)")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--output', help="Write JSON results to this file instead of stdout")
+    parser.add_argument('--keep', action='store_true', help="Keep the generated dataset directory")
+    args = parser.parse_args()
+
+    if args.backend:
+        # Spawned stage processes read the backend from the environment when importing Config
+        os.environ['FACE_RECOGNITION_BACKEND'] = args.backend
+    from config import Config
+
+    workdir = tempfile.mkdtemp(prefix='recognition_bench_')
+    try:
+        build_seconds = build_dataset(workdir, args.students, args.images, args.queries)
+        stages = [s for s in STAGES if s in args.stages]
+        if 'train_cold' not in stages and any(s not in ('detect', 'preprocess', 'train_warm') for s in stages):
+            stages.insert(0, 'train_cold')  # later stages need a trained model
+
+        results = {
+            'config': {
+                'students': args.students,
+                'images_per_student': args.images,
+                'queries': args.queries,
+                'repeat': args.repeat,
+                'backend': args.backend or Config.FACE_RECOGNITION_BACKEND,
+                'model_storage_dtype': Config.MODEL_STORAGE_DTYPE,
+                'opencv': cv2.__version__,
+                'numpy': np.__version__,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count()
+            },
+            'dataset_seconds': build_seconds,
+            'stages': {}
+        }
+        for stage in stages:
+            print(f"⏱️ {stage}...", file=sys.stderr)
+            results['stages'][stage] = measure(stage, workdir, args.repeat, args.batch_size)
+    finally:
+        if args.keep:
+            print(f"📁 Dataset kept in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"📄 Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -30,13 +30,17 @@ class Config:
     UPLOAD_FOLDER = 'student_images'
     MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+    UPLOAD_DECODE_MIN_SIDE = int(os.environ.get('UPLOAD_DECODE_MIN_SIDE', 1280))  # Decode large JPEGs at 1/2-1/8 scale down to this size
 
     # Database
     DB_HOST = os.environ.get('DB_HOST', 'localhost')
     DB_USER = os.environ.get('DB_USER', 'root')
     DB_PASSWORD = os.environ.get('DB_PASSWORD', '')
     DB_NAME = os.environ.get('DB_NAME', 'smart_attendance')
-    DB_POOL_SIZE = 5
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))  # Idle connections kept per process
+    DB_POOL_OVERFLOW = int(os.environ.get('DB_POOL_OVERFLOW', 5))  # Extra connections opened under load
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 5.0))  # Seconds to wait for a free connection
+    DB_POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', 1.0))  # Ping connections idle this long on checkout (0 = always)
 
     # Email
     EMAIL_USER = os.environ.get('EMAIL_USER')
@@ -46,14 +50,46 @@ class Config:
 
     # Face Recognition
     FACE_RECOGNITION_THRESHOLD = 70  # Confidence threshold (0-100)
+    FACE_RECOGNITION_BACKEND = os.environ.get('FACE_RECOGNITION_BACKEND', 'opencv')  # 'opencv' or 'numpy'
+    MODEL_STORAGE_DTYPE = os.environ.get('MODEL_STORAGE_DTYPE', 'float16')  # numpy backend: float32, float16 or uint8
+    # Windows cannot replace a model file that is memory-mapped, so read it into RAM there
+    MODEL_MMAP = os.environ.get('MODEL_MMAP', '0' if os.name == 'nt' else '1') == '1'
+    MODEL_REGISTRY_KEEP = int(os.environ.get('MODEL_REGISTRY_KEEP', 5))  # Model versions kept for rollback (0 = all)
     MIN_FACE_SIZE = (30, 30)
     FACE_DETECTION_SCALE_FACTOR = 1.1
     FACE_DETECTION_MIN_NEIGHBORS = 5
+    FACE_DETECTION_MAX_SIDE = int(os.environ.get('FACE_DETECTION_MAX_SIDE', 640))  # Detect on downscaled copy (0 = full resolution)
+    GROUP_DETECTION_MAX_SIDE = int(os.environ.get('GROUP_DETECTION_MAX_SIDE', 1920))  # Classroom photos have small faces
+    CASCADE_POOL_SIZE = int(os.environ.get('CASCADE_POOL_SIZE', os.cpu_count() or 1))  # Haar cascades shared by request threads
+    RECOGNITION_WORKERS = int(os.environ.get('RECOGNITION_WORKERS', 4))  # Parallel predictions per group photo
+    RECOGNITION_SERVICE = os.environ.get('RECOGNITION_SERVICE', '')  # 'host:port' or 'unix:/path' of recognition_service.py
+    RECOGNITION_SERVICE_AUTHKEY = os.environ.get('RECOGNITION_SERVICE_AUTHKEY', '')  # Defaults to SECRET_KEY
+    RECOGNITION_SERVICE_TIMEOUT = float(os.environ.get('RECOGNITION_SERVICE_TIMEOUT', 2.0))  # Seconds before falling back
+    RECOGNITION_SERVICE_PROCESSES = int(os.environ.get('RECOGNITION_SERVICE_PROCESSES', 0))  # 0 = CPU count with a shared mmap model, else 1
+    RECOGNITION_BATCH_WINDOW_MS = float(os.environ.get('RECOGNITION_BATCH_WINDOW_MS', 5))  # Wait for concurrent requests
+    RECOGNITION_BATCH_MAX = int(os.environ.get('RECOGNITION_BATCH_MAX', 64))  # Faces per micro-batch
+    DEPARTMENT_SHARDS = os.environ.get('DEPARTMENT_SHARDS', '0') == '1'  # Also train one model per department
+    KIOSK_DEPARTMENT = os.environ.get('KIOSK_DEPARTMENT', '')  # Default shard for recognition requests
+    FACE_QUALITY_GATE = os.environ.get('FACE_QUALITY_GATE', '1') == '1'  # Reject hopeless crops before prediction
+    FACE_QUALITY_MIN_SIZE = int(os.environ.get('FACE_QUALITY_MIN_SIZE', 60))  # Smallest face side in pixels
+    FACE_MIN_BRIGHTNESS = float(os.environ.get('FACE_MIN_BRIGHTNESS', 40))  # Mean gray level (0-255)
+    FACE_MAX_BRIGHTNESS = float(os.environ.get('FACE_MAX_BRIGHTNESS', 220))
+    FACE_MIN_SHARPNESS = float(os.environ.get('FACE_MIN_SHARPNESS', 40))  # Laplacian variance at 64x64
     TRAINING_IMAGES_PER_STUDENT = 30
+    FACE_PROTOTYPES_PER_STUDENT = int(os.environ.get('FACE_PROTOTYPES_PER_STUDENT', 0))  # 0 = keep every training image
+    TRAINING_WORKERS = int(os.environ.get('TRAINING_WORKERS', os.cpu_count() or 1))  # Parallel image loaders
+    TRAINING_COALESCE_SECONDS = float(os.environ.get('TRAINING_COALESCE_SECONDS', 2.0))  # Merge registrations within this window
 
     # Attendance
     CLASS_START_TIME = '09:00'
     LATE_THRESHOLD_MINUTES = 15  # Minutes after class start to mark as late
+    ATTENDANCE_COALESCE = os.environ.get('ATTENDANCE_COALESCE', '1') == '1'  # Group-commit concurrent marks
+    ATTENDANCE_COALESCE_WINDOW_MS = float(os.environ.get('ATTENDANCE_COALESCE_WINDOW_MS', 5))  # Wait for more marks per flush
+    ATTENDANCE_COALESCE_MAX = int(os.environ.get('ATTENDANCE_COALESCE_MAX', 200))  # Marks per transaction
+    ROSTER_CACHE = os.environ.get('ROSTER_CACHE', '1') == '1'  # Resolve students from an in-memory roster
+    ROSTER_CACHE_TTL = float(os.environ.get('ROSTER_CACHE_TTL', 300))  # Reload for edits made outside the app (0 = never)
+    ROSTER_GENERATION_FILE = os.environ.get('ROSTER_GENERATION_FILE',
+                                            os.path.join('cache', 'roster_generation.json'))  # Shared by all workers
 
     # Folders
     RECOGNIZER_FOLDER = 'recognizer'
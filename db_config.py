@@ -1,15 +1,184 @@
 import mysql.connector
-from mysql.connector import pooling
-import os
-
-# Create a connection pool for better performance
-db_pool = pooling.MySQLConnectionPool(
-    pool_name="smart_attendance_pool",
-    pool_size=5,
-    host=os.environ.get("DB_HOST", "localhost"),
-    user=os.environ.get("DB_USER", "root"),
-    password=os.environ.get("DB_PASSWORD", ""),
-    database=os.environ.get("DB_NAME", "smart_attendance"),
+from mysql.connector.errors import PoolError
+import threading
+import time
+from collections import deque
+from config import Config
+
+
+class PooledConnection:
+    """
+    A connection checked out of ConnectionPool. Behaves like the underlying
+    MySQL connection; close() hands it back to the pool (safe to call twice).
+    """
+
+    def __init__(self, pool, cnx):
+        self._pool = pool
+        self._cnx = cnx
+
+    def __getattr__(self, name):
+        if self._cnx is None:
+            raise AttributeError(f"connection already returned to the pool ({name})")
+        return getattr(self._cnx, name)
+
+    def close(self):
+        cnx, self._cnx = self._cnx, None
+        if cnx is not None:
+            self._pool.release(cnx)
+
+
+class ConnectionPool:
+    """
+    Thread-safe MySQL connection pool sized from Config.
+    Keeps up to size idle connections and opens up to overflow extra ones
+    under load (closed again when returned). When every connection is in
+    use, callers wait up to timeout seconds before PoolError is raised.
+    Connections idle for more than ping_after seconds are pinged (and
+    reconnected) on checkout. Connections are opened on first use.
+    """
+
+    def __init__(self, size=None, overflow=None, timeout=None, ping_after=None, **connect_args):
+        self.size = Config.DB_POOL_SIZE if size is None else size
+        self.overflow = Config.DB_POOL_OVERFLOW if overflow is None else overflow
+        self.timeout = Config.DB_POOL_TIMEOUT if timeout is None else timeout
+        self.ping_after = Config.DB_POOL_PING_AFTER if ping_after is None else ping_after
+        self.connect_args = connect_args
+        self._cond = threading.Condition()
+        self._idle = deque()  # (connection, returned at), most recently returned last
+        self._open = 0
+        self._in_use = 0
+
+        self._acquisitions = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._max_wait = 0.0
+        self._exhaustions = 0
+        self._health_check_failures = 0
+        self._overflow_opened = 0
+        self._peak_in_use = 0
+
+    def _connect(self):
+        return mysql.connector.connect(**self.connect_args)
+
+    def get_connection(self):
+        """Check out a connection, waiting up to timeout seconds if all are in use"""
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        cnx = None
+        returned_at = None
+        with self._cond:
+            self._acquisitions += 1
+            waited = False
+            while True:
+                if self._idle:
+                    cnx, returned_at = self._idle.pop()
+                    break
+                if self._open < self.size + self.overflow:
+                    self._open += 1
+                    if self._open > self.size:
+                        self._overflow_opened += 1
+                    break
+                if not waited:
+                    waited = True
+                    self._waits += 1
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._exhaustions += 1
+                    self._wait_seconds += self.timeout
+                    self._max_wait = max(self._max_wait, self.timeout)
+                    raise PoolError(f"Failed getting connection; pool exhausted "
+                                    f"({self._in_use} in use, waited {self.timeout:g}s)")
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            if waited:
+                elapsed = time.perf_counter() - start
+                self._wait_seconds += elapsed
+                self._max_wait = max(self._max_wait, elapsed)
+
+        try:
+            if cnx is None:
+                cnx = self._connect()
+            elif time.monotonic() - returned_at >= self.ping_after:
+                cnx = self._check(cnx)
+        except Exception:
+            self._discard(cnx)
+            raise
+        return PooledConnection(self, cnx)
+
+    def _check(self, cnx):
+        """Health check on checkout: ping, replacing the connection if it is gone"""
+        try:
+            cnx.ping()
+            return cnx
+        except mysql.connector.Error as err:
+            with self._cond:
+                self._health_check_failures += 1
+            print(f"⚠️ Pooled database connection failed its health check, reconnecting: {err}")
+            try:
+                cnx.close()
+            except Exception:
+                pass
+            return self._connect()
+
+    def _discard(self, cnx):
+        """Give up a checked-out slot without returning a connection to the pool"""
+        if cnx is not None:
+            try:
+                cnx.close()
+            except Exception:
+                pass
+        with self._cond:
+            self._open -= 1
+            self._in_use -= 1
+            self._cond.notify()
+
+    def release(self, cnx):
+        """Return a connection: roll back any open transaction and keep it idle (or close overflow)"""
+        try:
+            if cnx.in_transaction:
+                cnx.rollback()
+        except Exception:
+            self._discard(cnx)
+            return
+        with self._cond:
+            if self._open <= self.size:
+                self._idle.append((cnx, time.monotonic()))
+                self._in_use -= 1
+                self._cond.notify()
+                return
+        # Overflow connection: close it so the pool shrinks back to size
+        self._discard(cnx)
+
+    def stats(self):
+        """Pool usage counters, for sizing the pool against the worker count"""
+        with self._cond:
+            return {
+                'size': self.size,
+                'overflow': self.overflow,
+                'timeout': self.timeout,
+                'open': self._open,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'peak_in_use': self._peak_in_use,
+                'acquisitions': self._acquisitions,
+                'waits': self._waits,
+                'total_wait_ms': round(self._wait_seconds * 1000, 2),
+                'avg_wait_ms': round(self._wait_seconds / self._waits * 1000, 2) if self._waits else 0.0,
+                'max_wait_ms': round(self._max_wait * 1000, 2),
+                'exhaustions': self._exhaustions,
+                'overflow_opened': self._overflow_opened,
+                'health_check_failures': self._health_check_failures
+            }
+
+
+# Shared connection pool for the application
+db_pool = ConnectionPool(
+    host=Config.DB_HOST,
+    user=Config.DB_USER,
+    password=Config.DB_PASSWORD,
+    database=Config.DB_NAME,
     autocommit=False
 )
 
@@ -0,0 +1,290 @@
+"""
+Standalone recognition service. Holds the trained model once for every web
+worker and matches face crops sent by utils.recognition_client.
+
+Concurrent requests are collected into micro-batches (up to
+Config.RECOGNITION_BATCH_MAX faces or Config.RECOGNITION_BATCH_WINDOW_MS)
+and matched on a process pool, so prediction runs outside the web
+workers' GIL. Pool workers load the model through the shared recognizer
+cache and pick up newly published versions on their own.
+
+Every pool worker holds its own recognizer. Only the numpy backend with
+MODEL_MMAP shares the model's pages between workers; with the opencv
+backend each worker would parse a private copy of the YAML model, so the
+service then defaults to a single matching process. A pool broken by a
+crashed worker is replaced and the affected requests get an error reply.
+
+Usage (from the project root):
+    python recognition_service.py                       # Config.RECOGNITION_SERVICE or localhost:6001
+    python recognition_service.py --address unix:/tmp/recognizer.sock --processes 4
+
+Then set RECOGNITION_SERVICE to the same address for the web app.
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.connection import Listener
+from config import Config
+from utils.recognition_client import parse_service_address, service_authkey
+
+DEFAULT_ADDRESS = 'localhost:6001'
+
+# Smallest number of faces worth sending to a separate pool worker
+MIN_CHUNK = 8
+
+# Longest a connection waits for its batch before replying with an error
+REQUEST_TIMEOUT_SECONDS = 30
+
+
+def default_processes():
+    """
+    Matching processes when none are configured: one per CPU if the
+    workers can share a memory-mapped numpy model, otherwise one, so the
+    model is held once
+    """
+    from utils.model_cache import get_backend
+    if get_backend() == 'numpy' and Config.MODEL_MMAP:
+        return os.cpu_count() or 1
+    return 1
+
+
+def _warm_worker():
+    """Load the model in a pool worker before the first batch arrives"""
+    from utils.face_utils import get_recognizers
+    get_recognizers()
+    return os.getpid()
+
+
+def _match_chunk(department, crops):
+    """Pool worker: match crops against the department shard and the global model"""
+    from utils.face_utils import get_recognizers, match_crops
+    recognizers = get_recognizers(department)
+    if not recognizers:
+        return None
+    return match_crops(crops, recognizers)
+
+
+class _Request:
+    """One client request waiting for its slice of a batch"""
+
+    def __init__(self, department, crops):
+        self.department = department
+        self.crops = crops
+        self.done = threading.Event()
+        self.reply = None
+
+
+class RecognitionService:
+    """
+    Accepts connections on one thread each, queues their crops for the
+    batcher thread and replies once the pool has matched the batch.
+    """
+
+    def __init__(self, address, processes=None, batch_window_ms=None, batch_max=None):
+        self.address = address
+        self.processes = processes or Config.RECOGNITION_SERVICE_PROCESSES or default_processes()
+        self.batch_window = (Config.RECOGNITION_BATCH_WINDOW_MS if batch_window_ms is None
+                             else batch_window_ms) / 1000
+        self.batch_max = batch_max or Config.RECOGNITION_BATCH_MAX
+        self.requests = queue.Queue()
+        self.pool = None
+        self._pool_lock = threading.Lock()
+        self._pool_restarts = 0
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._batched_requests = 0
+        self._batched_faces = 0
+        self._largest_batch = 0
+        self._match_seconds = 0.0
+
+    def _handle_connection(self, conn):
+        """Serve one client connection (one request in flight at a time)"""
+        try:
+            while True:
+                message = conn.recv()
+                if message[0] == 'match':
+                    _, department, crops = message
+                    request = _Request(department, crops)
+                    self.requests.put(request)
+                    if request.done.wait(REQUEST_TIMEOUT_SECONDS):
+                        conn.send(request.reply)
+                    else:
+                        conn.send(('error', f"no result within {REQUEST_TIMEOUT_SECONDS}s"))
+                elif message[0] == 'stats':
+                    conn.send(('ok', self.stats()))
+                else:
+                    conn.send(('error', f"unknown request {message[0]!r}"))
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def _batch_loop(self):
+        """Collect concurrent requests into micro-batches and dispatch them"""
+        while True:
+            batch = [self.requests.get()]
+            faces = len(batch[0].crops)
+            deadline = time.perf_counter() + self.batch_window
+            while faces < self.batch_max:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self.requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                faces += len(request.crops)
+
+            by_department = {}
+            for request in batch:
+                by_department.setdefault(request.department, []).append(request)
+            for department, requests in by_department.items():
+                try:
+                    self._dispatch(department, requests)
+                except Exception as e:
+                    # Keep the batcher alive; the requests get an error and fall back in-process
+                    print(f"❌ Dispatching a batch failed: {e}")
+                    self._fail(requests, e)
+
+            with self._stats_lock:
+                self._batches += 1
+                self._batched_requests += len(batch)
+                self._batched_faces += faces
+                self._largest_batch = max(self._largest_batch, faces)
+
+    def _dispatch(self, department, requests):
+        """Split one department's faces across the pool and reply once all chunks finish"""
+        crops = [crop for request in requests for crop in request.crops]
+        chunk = max(MIN_CHUNK, -(-len(crops) // self.processes))
+        pool = self.pool
+        try:
+            futures = [pool.submit(_match_chunk, department, crops[i:i + chunk])
+                       for i in range(0, len(crops), chunk)]
+        except BrokenProcessPool:
+            self._restart_pool(pool)
+            raise
+        remaining = [len(futures)]
+        lock = threading.Lock()
+        start = time.perf_counter()
+
+        def on_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            self._complete(requests, futures, pool, time.perf_counter() - start)
+
+        for future in futures:
+            future.add_done_callback(on_done)
+
+    def _complete(self, requests, futures, pool, elapsed):
+        try:
+            parts = [future.result() for future in futures]
+            if any(part is None for part in parts):
+                reply = ('error', 'Model not trained')
+                matches = None
+            else:
+                reply = None
+                matches = [match for part in parts for match in part]
+        except BrokenProcessPool as e:
+            self._restart_pool(pool)
+            reply = ('error', f"matching process died: {e}")
+            matches = None
+        except Exception as e:
+            reply = ('error', str(e))
+            matches = None
+
+        offset = 0
+        for request in requests:
+            if matches is None:
+                request.reply = reply
+            else:
+                request.reply = ('ok', matches[offset:offset + len(request.crops)])
+                offset += len(request.crops)
+            request.done.set()
+        with self._stats_lock:
+            self._match_seconds += elapsed
+
+    def _fail(self, requests, error):
+        for request in requests:
+            request.reply = ('error', str(error))
+            request.done.set()
+
+    def _start_pool(self):
+        # spawn keeps the pool independent of the service's threads
+        pool = ProcessPoolExecutor(max_workers=self.processes,
+                                   mp_context=multiprocessing.get_context('spawn'))
+        # Workers start on demand; submitting one job per process starts and warms them all
+        return pool, [pool.submit(_warm_worker) for _ in range(self.processes)]
+
+    def _restart_pool(self, broken):
+        """Replace a pool broken by a crashed worker (once, however many batches noticed)"""
+        with self._pool_lock:
+            if self.pool is not broken:
+                return
+            print("⚠️ A matching process died; starting a new process pool")
+            self.pool, _ = self._start_pool()
+            self._pool_restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'processes': self.processes,
+                'pool_restarts': self._pool_restarts,
+                'batches': self._batches,
+                'requests': self._batched_requests,
+                'faces': self._batched_faces,
+                'avg_faces_per_batch': self._batched_faces / self._batches if self._batches else 0.0,
+                'avg_requests_per_batch': self._batched_requests / self._batches if self._batches else 0.0,
+                'largest_batch': self._largest_batch,
+                'avg_match_ms': self._match_seconds / self._batches * 1000 if self._batches else 0.0
+            }
+
+    def serve_forever(self):
+        address, family = parse_service_address(self.address)
+        if family == 'AF_UNIX' and os.path.exists(address):
+            os.remove(address)  # stale socket from a previous run
+
+        self.pool, warming = self._start_pool()
+        warmed = {future.result() for future in warming}
+        print(f"🧠 Model loaded in {len(warmed)} worker process(es)")
+        threading.Thread(target=self._batch_loop, name='batcher', daemon=True).start()
+
+        with Listener(address, family=family, authkey=service_authkey()) as listener:
+            print(f"🛰️ Recognition service listening on {self.address} with {self.processes} worker process(es)")
+            try:
+                while True:
+                    try:
+                        conn = listener.accept()
+                    except (OSError, multiprocessing.AuthenticationError) as e:
+                        print(f"⚠️ Rejected connection: {e}")
+                        continue
+                    threading.Thread(target=self._handle_connection, args=(conn,), daemon=True).start()
+            except KeyboardInterrupt:
+                print("🛑 Recognition service stopping")
+            finally:
+                self.pool.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared face recognition service")
+    parser.add_argument('--address', default=Config.RECOGNITION_SERVICE or DEFAULT_ADDRESS,
+                        help="'host:port' or 'unix:/path/to.sock'")
+    parser.add_argument('--processes', type=int, default=None,
+                        help="Matching processes (default: RECOGNITION_SERVICE_PROCESSES, or the CPU "
+                             "count for a memory-mapped numpy model and 1 otherwise)")
+    parser.add_argument('--batch-window-ms', type=float, default=None,
+                        help=f"Time to wait for more requests per batch (default: {Config.RECOGNITION_BATCH_WINDOW_MS})")
+    parser.add_argument('--batch-max', type=int, default=None,
+                        help=f"Maximum faces per batch (default: {Config.RECOGNITION_BATCH_MAX})")
+    args = parser.parse_args()
+
+    RecognitionService(args.address, args.processes, args.batch_window_ms, args.batch_max).serve_forever()
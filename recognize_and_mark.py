@@ -1,30 +1,134 @@
-import cv2
-import numpy as np
+import argparse
+import csv
 import os
-from utils.face_utils import detect_face
-from utils.attendance_utils import mark_attendance
-from db_config import get_connection
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+from config import Config
+from utils.face_utils import detect_faces, preprocess_face, get_recognizers
+from utils.face_quality import quality_gate
+from utils.face_tracker import FaceTracker
+from utils.attendance_utils import mark_attendance_status, mark_attendance_bulk_by_id
+from utils.roster_cache import roster_cache
+
+# Raw LBPH distance below which a face counts as recognized
+MATCH_THRESHOLD = 70
+
+
+def identify_face(face, recognizers):
+    """Predict one preprocessed face, returning (student_id or None, confidence)"""
+    student_id, confidence = None, None
+    for _, recognizer in recognizers:
+        id_, distance = recognizer.predict(face)
+        confidence = distance if confidence is None else min(confidence, distance)
+        if distance < MATCH_THRESHOLD:
+            student_id = id_
+            break
+    return student_id, confidence
+
+
+def recognize_frame(gray, recognizers, tracker=None, frame_index=0):
+    """
+    Detect and identify every face in one grayscale frame.
+    With a tracker, faces already followed from earlier frames reuse their
+    cached identity and are only re-predicted when the tracker asks for it.
+    Returns list of ((x, y, w, h), student_id or None, confidence).
+    """
+    boxes = [(int(x), int(y), int(w), int(h)) for (x, y, w, h) in detect_faces(gray)]
+    if tracker is None:
+        return [(box, *predict_box(gray, box, recognizers)) for box in boxes]
+
+    detections = []
+    for track, needs_prediction in tracker.update(boxes, frame_index):
+        if needs_prediction:
+            student_id, confidence = predict_box(gray, track.box, recognizers)
+            # Rejected crops leave the track unpredicted so the next frame tries again
+            if confidence is not None:
+                tracker.set_identity(track, student_id, confidence, frame_index)
+        detections.append((track.box, track.student_id, track.confidence))
+    return detections
+
+
+def predict_box(gray, box, recognizers):
+    """
+    Identify the face in one box, skipping prediction for crops that fail
+    the quality gate. Returns (student_id or None, confidence or None).
+    """
+    x, y, w, h = box
+    face = gray[y:y + h, x:x + w]
+    if quality_gate.check(face):
+        return None, None
+    start = time.perf_counter()
+    result = identify_face(preprocess_face(face), recognizers)
+    quality_gate.record_prediction(time.perf_counter() - start)
+    return result
+
+
+def lookup_student(student_id):
+    """Return (name, roll_no) for a student id, or None"""
+    student = roster_cache.get_by_id(student_id)
+    return (student.name, student.roll_no) if student else None
+
+
+def persist_student(student_id, confidence, names):
+    """
+    Mark attendance for a recognized student id.
+    Returns False if the database write failed and a later frame should retry.
+    """
+    try:
+        result = lookup_student(student_id)
+    except Exception as e:
+        print(f"⚠️ Could not look up ID {student_id}, will retry: {e}")
+        return False
+    if not result:
+        print(f"⚠️ ID {student_id} not found in database.")
+        return True
+
+    name, roll = result
+    status = mark_attendance_status(roll)
+    if status == 'error':
+        print(f"⚠️ Could not mark {name} ({roll}), will retry")
+        return False
+    names[student_id] = f"{name} ({roll})"
+    print(f"✅ Recognized: {names[student_id]} | Confidence: {confidence:.2f}")
+    return True
+
+
+def draw_detections(frame, detections, names):
+    """Draw face boxes with the student's name (if known) onto a BGR frame"""
+    for (x, y, w, h), student_id, _ in detections:
+        if student_id is None:
+            label = "Unknown"
+        else:
+            label = names.get(student_id, f"ID {student_id}")
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        cv2.putText(frame, label, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
 
-def recognize_and_mark():
+
+def recognize_and_mark(camera=0, tracking=True):
+    """
+    Serial loop: capture, recognize and mark attendance on one thread.
+    Students marked earlier in the session are skipped without touching
+    the database.
+    """
     print("📷 Starting real-time recognition...")
 
-    trainer_path = 'recognizer/trainer.yml'
-    if not os.path.exists(trainer_path) or os.stat(trainer_path).st_size == 0:
-        print("❌ Error: trainer.yml not found or empty. Please train the model first.")
+    if not get_recognizers():
+        print("❌ Error: No trained model found. Please train the model first.")
         return
 
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
-    recognizer.read(trainer_path)
-
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
-    cap = cv2.VideoCapture(0)
+    cap = cv2.VideoCapture(camera)
 
     if not cap.isOpened():
         print("❌ Error: Could not open webcam.")
         return
 
-    conn = get_connection()
-    cursor = conn.cursor()
+    names = {}
+    seen = set()  # student ids already handled this session
+    tracker = FaceTracker() if tracking else None
+    frame_index = 0
 
     while True:
         ret, frame = cap.read()
@@ -33,37 +137,374 @@ def recognize_and_mark():
             break
 
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-
-        for (x, y, w, h) in faces:
-            face = gray[y:y+h, x:x+w]
-            id_, confidence = recognizer.predict(face)
-
-            if confidence < 70:
-                cursor.execute("SELECT name, roll_no FROM students WHERE id = %s", (id_,))
-                result = cursor.fetchone()
-                if result:
-                    name, roll = result
-                    mark_attendance(roll)
-                    label = f"{name} ({roll})"
-                    print(f"✅ Recognized: {label} | Confidence: {confidence:.2f}")
-                else:
-                    label = "Unknown"
-                    print(f"⚠️ ID {id_} not found in database.")
-            else:
-                label = "Unknown"
-                print("🟡 Unknown face detected.")
+        detections = recognize_frame(gray, get_recognizers(), tracker, frame_index)
+        frame_index += 1
 
-            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-            cv2.putText(frame, label, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+        for _, student_id, confidence in detections:
+            if student_id is None:
+                print("🟡 Unknown face detected.")
+                continue
+            if student_id in seen:
+                continue
+            if persist_student(student_id, confidence, names):
+                seen.add(student_id)
 
+        draw_detections(frame, detections, names)
         cv2.imshow("Recognition", frame)
         if cv2.waitKey(1) == 13:  # Enter key
             break
 
     cap.release()
     cv2.destroyAllWindows()
-    conn.close()
+    if tracker is not None:
+        stats = tracker.stats()
+        print(f"📊 {stats['predictions']} predictions, {stats['skipped']} reused from tracks "
+              f"({stats['skip_rate']:.0%} skipped)")
+
+
+class StageStats:
+    """Thread-safe frame counter for one pipeline stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._count = 0
+        self._busy = 0.0
+        self._window_start = time.perf_counter()
+
+    def record(self, busy_seconds):
+        with self._lock:
+            self._count += 1
+            self._busy += busy_seconds
+
+    def snapshot(self):
+        """Return (items/s, average ms per item) since the last snapshot"""
+        with self._lock:
+            now = time.perf_counter()
+            elapsed = max(now - self._window_start, 1e-9)
+            fps = self._count / elapsed
+            avg_ms = self._busy / self._count * 1000 if self._count else 0.0
+            self._count = 0
+            self._busy = 0.0
+            self._window_start = now
+            return fps, avg_ms
+
+
+def put_latest(q, item):
+    """Put into a bounded queue, dropping the oldest item instead of blocking"""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
+
+class RecognitionPipeline:
+    """
+    Pipelined real-time recognition: capture, detect/recognize and
+    persistence run on separate threads connected by bounded queues.
+    Stale frames are dropped so the video never lags behind the camera,
+    and database calls never stall capture or recognition. Each student is
+    sent to the persistence stage at most once per session.
+    """
+
+    def __init__(self, camera=0, frame_queue_size=2, persist_queue_size=100, stats_interval=5.0,
+                 tracking=True):
+        self.camera = camera
+        self.frame_queue = queue.Queue(maxsize=frame_queue_size)
+        self.persist_queue = queue.Queue(maxsize=persist_queue_size)
+        self.stats_interval = stats_interval
+        self.stop_event = threading.Event()
+
+        self.stats = {name: StageStats(name) for name in ('capture', 'recognize', 'persist')}
+        self.dropped_frames = 0
+        self.names = {}
+        self.tracker = FaceTracker() if tracking else None
+        self.seen = set()  # student ids queued or marked this session (dropped again if marking fails)
+
+        self._latest_lock = threading.Lock()
+        self._latest_frame = None
+        self._latest_detections = []
+
+    def _capture_loop(self, cap):
+        while not self.stop_event.is_set():
+            start = time.perf_counter()
+            ret, frame = cap.read()
+            if not ret:
+                print("⚠️ Failed to capture frame.")
+                self.stop_event.set()
+                break
+            if self.frame_queue.full():
+                self.dropped_frames += 1
+            put_latest(self.frame_queue, frame)
+            self.stats['capture'].record(time.perf_counter() - start)
+
+    def _recognize_loop(self):
+        frame_index = 0
+        while not self.stop_event.is_set():
+            try:
+                frame = self.frame_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            start = time.perf_counter()
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            detections = recognize_frame(gray, get_recognizers(), self.tracker, frame_index)
+            frame_index += 1
+            with self._latest_lock:
+                self._latest_frame = frame
+                self._latest_detections = detections
+            for _, student_id, confidence in detections:
+                if student_id is not None and student_id not in self.seen:
+                    self.seen.add(student_id)
+                    self.persist_queue.put((student_id, confidence))
+            self.stats['recognize'].record(time.perf_counter() - start)
+
+    def _persist_loop(self):
+        while not self.stop_event.is_set() or not self.persist_queue.empty():
+            try:
+                student_id, confidence = self.persist_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            start = time.perf_counter()
+            if not persist_student(student_id, confidence, self.names):
+                # Let a later frame queue this student again
+                self.seen.discard(student_id)
+            self.stats['persist'].record(time.perf_counter() - start)
+
+    def report(self):
+        """Print per-stage throughput and queue depths"""
+        parts = []
+        for name, stats in self.stats.items():
+            fps, avg_ms = stats.snapshot()
+            parts.append(f"{name} {fps:5.1f}/s ({avg_ms:5.1f} ms)")
+        print(f"📊 {' | '.join(parts)} | frame queue {self.frame_queue.qsize()}/{self.frame_queue.maxsize}"
+              f" | persist queue {self.persist_queue.qsize()}/{self.persist_queue.maxsize}"
+              f" | dropped frames {self.dropped_frames}")
+        if self.tracker is not None:
+            stats = self.tracker.stats()
+            print(f"   tracks {stats['active_tracks']} | predictions {stats['predictions']}"
+                  f" | reused {stats['skipped']} ({stats['skip_rate']:.0%}) | students handled {len(self.seen)}")
+
+    def run(self):
+        print("📷 Starting pipelined real-time recognition...")
+
+        if not get_recognizers():
+            print("❌ Error: No trained model found. Please train the model first.")
+            return
+
+        cap = cv2.VideoCapture(self.camera)
+        if not cap.isOpened():
+            print("❌ Error: Could not open webcam.")
+            return
+
+        threads = [
+            threading.Thread(target=self._capture_loop, args=(cap,), name='capture', daemon=True),
+            threading.Thread(target=self._recognize_loop, name='recognize', daemon=True),
+            threading.Thread(target=self._persist_loop, name='persist', daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+
+        # Display stays on the main thread (required by cv2.imshow on most platforms)
+        last_report = time.perf_counter()
+        while not self.stop_event.is_set():
+            with self._latest_lock:
+                frame = None if self._latest_frame is None else self._latest_frame.copy()
+                detections = list(self._latest_detections)
+            if frame is not None:
+                draw_detections(frame, detections, self.names)
+                cv2.imshow("Recognition", frame)
+            if cv2.waitKey(1) == 13:  # Enter key
+                self.stop_event.set()
+            if time.perf_counter() - last_report >= self.stats_interval:
+                self.report()
+                last_report = time.perf_counter()
+
+        for thread in threads:
+            thread.join(timeout=5)
+        cap.release()
+        cv2.destroyAllWindows()
+        self.report()
+
+
+def list_frame_files(directory):
+    """Sorted image files of a frame directory"""
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.rsplit('.', 1)[-1].lower() in Config.ALLOWED_EXTENSIONS]
+
+
+def count_frames(source):
+    """Number of frames in a video file or frame directory"""
+    if os.path.isdir(source):
+        return len(list_frame_files(source))
+    cap = cv2.VideoCapture(source)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return total
+
+
+def iter_frames(source, start=0, stop=None, step=1):
+    """
+    Yield (frame_index, grayscale frame) from a video file or a directory
+    of frame images, for frames start <= index < stop.
+    """
+    if os.path.isdir(source):
+        files = list_frame_files(source)
+        for index in range(start, len(files) if stop is None else min(stop, len(files)), step):
+            gray = cv2.imread(files[index], cv2.IMREAD_GRAYSCALE)
+            if gray is not None:
+                yield index, gray
+        return
+
+    cap = cv2.VideoCapture(source)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    index = start
+    try:
+        while stop is None or index < stop:
+            if (index - start) % step:
+                # grab() skips decoding frames that are not analysed
+                if not cap.grab():
+                    break
+            else:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield index, cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            index += 1
+    finally:
+        cap.release()
+
+
+def process_segment(source, start=0, stop=None, step=1, tracking=True):
+    """
+    Recognize every analysed frame of one segment without display.
+    Returns {'first_seen': {student_id: (frame_index, confidence)}, 'frames', 'faces'}.
+    """
+    tracker = FaceTracker(repredict_interval=max(1, 30 // step)) if tracking else None
+    first_seen = {}
+    frames = faces = 0
+    for frame_index, gray in iter_frames(source, start, stop, step):
+        detections = recognize_frame(gray, get_recognizers(), tracker, frame_index)
+        frames += 1
+        faces += len(detections)
+        for _, student_id, confidence in detections:
+            if student_id is not None and student_id not in first_seen:
+                first_seen[student_id] = (frame_index, confidence)
+    return {'first_seen': first_seen, 'frames': frames, 'faces': faces}
+
+
+def process_offline(source, processes=1, step=1, tracking=True, mark=True, report_path=None):
+    """
+    Headless recognition of recorded footage (video file or frame directory).
+    The frame range is split into contiguous segments processed in parallel,
+    per-student first sightings are merged, and attendance is marked in one
+    bulk transaction. Returns the per-student report rows.
+    """
+    if not os.path.exists(source):
+        print(f"❌ Error: {source} does not exist.")
+        return []
+    if not get_recognizers():
+        print("❌ Error: No trained model found. Please train the model first.")
+        return []
+
+    total = count_frames(source)
+    fps = None
+    if not os.path.isdir(source):
+        cap = cv2.VideoCapture(source)
+        fps = cap.get(cv2.CAP_PROP_FPS) or None
+        cap.release()
+
+    processes = max(1, min(processes, total or 1))
+    bounds = [total * i // processes for i in range(processes + 1)]
+    # Segments start on an analysed frame so step stays aligned across them
+    segments = [(source, -(-bounds[i] // step) * step, bounds[i + 1] if i < processes - 1 else None,
+                 step, tracking)
+                for i in range(processes)]
+    print(f"🎞️ Processing {total or 'unknown number of'} frames from {source} "
+          f"({processes} process{'es' if processes > 1 else ''}, every {step} frame(s))...")
+
+    start_time = time.perf_counter()
+    if processes == 1:
+        results = [process_segment(*segments[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(process_segment, *zip(*segments)))
+    elapsed = time.perf_counter() - start_time
+
+    first_seen = {}
+    for result in results:
+        for student_id, seen in result['first_seen'].items():
+            if student_id not in first_seen or seen[0] < first_seen[student_id][0]:
+                first_seen[student_id] = seen
+    frames = sum(r['frames'] for r in results)
+    faces = sum(r['faces'] for r in results)
+    print(f"⏱️ {frames} frames, {faces} faces in {elapsed:.1f}s ({frames / max(elapsed, 1e-9):.1f} frames/s)")
+
+    outcomes = {}
+    default_status = 'not_marked'
+    if mark and first_seen:
+        try:
+            outcomes = mark_attendance_bulk_by_id(list(first_seen), marked_by='Video import')
+        except Exception as e:
+            # Keep the report: it is the record needed to mark these students later
+            print(f"❌ Could not mark attendance for {len(first_seen)} student(s): {e}")
+            default_status = 'error'
+
+    rows = []
+    for student_id, (frame_index, confidence) in sorted(first_seen.items(), key=lambda item: item[1][0]):
+        outcome = outcomes.get(student_id, {})
+        rows.append({
+            'student_id': student_id,
+            'name': outcome.get('name', ''),
+            'roll_no': outcome.get('roll_no', ''),
+            'first_frame': frame_index,
+            'first_seen_seconds': round(frame_index / fps, 2) if fps else '',
+            'confidence': round(confidence, 2),
+            'attendance': outcome.get('status', default_status)
+        })
+
+    print(f"{'first seen':>11}  {'student':<30} {'confidence':>10}  attendance")
+    for row in rows:
+        when = f"{row['first_seen_seconds']}s" if fps else f"frame {row['first_frame']}"
+        who = f"{row['name']} ({row['roll_no']})" if row['name'] else f"ID {row['student_id']}"
+        print(f"{when:>11}  {who:<30} {row['confidence']:10.2f}  {row['attendance']}")
+
+    if report_path:
+        with open(report_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ['student_id'])
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"📄 Report written to {report_path}")
+    return rows
+
 
 if __name__ == "__main__":
-    recognize_and_mark()
+    parser = argparse.ArgumentParser(description="Real-time face recognition attendance")
+    parser.add_argument('--camera', type=int, default=0, help="Camera index")
+    parser.add_argument('--pipelined', action='store_true',
+                        help="Run capture, recognition and database writes on separate threads")
+    parser.add_argument('--stats-interval', type=float, default=5.0,
+                        help="Seconds between pipeline statistics reports")
+    parser.add_argument('--no-tracking', action='store_true',
+                        help="Predict every face in every frame instead of reusing tracked identities")
+    parser.add_argument('--source', help="Video file or directory of frames to process headless")
+    parser.add_argument('--processes', type=int, default=1,
+                        help="Worker processes for --source (split by time segment)")
+    parser.add_argument('--frame-step', type=int, default=1, help="Analyse every Nth frame of --source")
+    parser.add_argument('--no-mark', action='store_true', help="Report only, do not mark attendance")
+    parser.add_argument('--report', help="Write the per-student first-seen report to this CSV file")
+    args = parser.parse_args()
+
+    if args.source:
+        process_offline(args.source, processes=args.processes, step=max(1, args.frame_step),
+                        tracking=not args.no_tracking, mark=not args.no_mark, report_path=args.report)
+    elif args.pipelined:
+        RecognitionPipeline(camera=args.camera, stats_interval=args.stats_interval,
+                            tracking=not args.no_tracking).run()
+    else:
+        recognize_and_mark(camera=args.camera, tracking=not args.no_tracking)
@@ -1,45 +1,322 @@
-import cv2
 import numpy as np
-from PIL import Image
 import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from utils.face_cache import cache_student_faces
+from utils.face_utils import LOADER_THREAD_PREFIX
+from utils.file_lock import FileLock
+from utils.prototypes import select_prototypes
+from utils.model_cache import read_model_version, create_recognizer, get_model_path, \
+    department_slug, get_shard_dir, MODEL_DIR, SHARDS_DIR, VERSION_FILE
+from utils.model_registry import publish_model, list_versions, rollback_model
 
-def train_face_model():
-    print("🧠 Starting training...")
-    data_dir = 'student_images'
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
+DATA_DIR = 'student_images'
 
-    faces = []
-    labels = []
+# Held from reading the current model (or the student folders) until the
+# new version is published, across every web worker and the training CLI,
+# so concurrent runs never build on the same version and drop each other's students
+TRAINING_LOCK_PATH = os.path.join(MODEL_DIR, 'training.lock')
 
-    for folder_name in os.listdir(data_dir):
-        folder_path = os.path.join(data_dir, folder_name)
 
-        if not os.path.isdir(folder_path):
-            continue
+def training_lock():
+    return FileLock(TRAINING_LOCK_PATH)
+
+
+def label_from_folder(folder_name):
+    """
+    Derive the numeric training label from a student folder name.
+    Returns None if the folder name contains no digits.
+    """
+    if not any(char.isdigit() for char in folder_name):
+        return None
+    return int(''.join(filter(str.isdigit, folder_name)))
+
+
+def load_folder_faces(folder_path):
+    """
+    Load the preprocessed 200x200 face crops of one student folder.
+    Crops come from the packed face cache; raw images are only decoded
+    the first time they are seen.
+    """
+    return list(cache_student_faces(folder_path))
+
+
+def model_exists(model_dir=MODEL_DIR):
+    """Check whether a trained model is available on disk"""
+    model_path = get_model_path(model_dir=model_dir)
+    return os.path.exists(model_path) and os.path.getsize(model_path) > 0
+
+
+def save_model(recognizer, model_dir=MODEL_DIR, **metadata):
+    """
+    Publish a trained recognizer as a new version in model_dir's registry.
+    Returns the new version number.
+    """
+    return publish_model(recognizer, model_dir, **metadata)
+
+
+def get_label_departments():
+    """
+    Map training labels to students.department via each student's image folder.
+    Returns None if the database is unavailable.
+    """
+    conn = None
+    try:
+        from db_config import get_connection
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT image_path, department FROM students WHERE department IS NOT NULL")
+        rows = cursor.fetchall()
+        cursor.close()
+    except Exception as e:
+        print(f"⚠️ Could not read student departments: {e}")
+        return None
+    finally:
+        if conn:
+            conn.close()
 
+    departments = {}
+    for image_path, department in rows:
+        label = label_from_folder(os.path.basename(os.path.normpath(image_path or '')))
+        if label is not None and department_slug(department):
+            departments[label] = department
+    return departments
+
+
+def group_by_department(faces, labels):
+    """
+    Split a training set into {slug: (department, faces, labels)}, keyed by
+    department_slug so spellings like "CSE" and "cse " share one shard.
+    Returns None if the departments could not be read.
+    """
+    departments = get_label_departments()
+    if departments is None:
+        return None
+    groups = {}
+    for face, label in zip(faces, labels):
+        department = departments.get(int(label))
+        if department:
+            _, dept_faces, dept_labels = groups.setdefault(department_slug(department), (department, [], []))
+            dept_faces.append(face)
+            dept_labels.append(label)
+    return groups
+
+
+def train_department_shards(faces, labels):
+    """
+    Train one model per students.department under recognizer/shards/,
+    and remove shards of departments that no longer have students.
+    The caller holds the training lock.
+    """
+    groups = group_by_department(faces, labels)
+    if groups is None:
+        # Without the departments every shard would look stale; keep them as they are
+        print("⚠️ Skipping department shards: student departments unavailable")
+        return
+    for department, dept_faces, dept_labels in groups.values():
+        start = time.perf_counter()
+        recognizer = create_recognizer()
+        recognizer.train(dept_faces, np.array(dept_labels))
+        version = save_model(recognizer, get_shard_dir(department), department=department,
+                             images=len(dept_faces), students=len(set(dept_labels)),
+                             training_seconds=round(time.perf_counter() - start, 3))
+        print(f"🏷️ Shard {department}: {len(dept_faces)} images, "
+              f"{len(set(dept_labels))} students (version {version})")
+
+    if os.path.isdir(SHARDS_DIR):
+        for slug in os.listdir(SHARDS_DIR):
+            if slug not in groups:
+                shutil.rmtree(os.path.join(SHARDS_DIR, slug), ignore_errors=True)
+                print(f"🗑️ Removed stale shard: {slug}")
+
+
+def update_department_shards(faces, labels):
+    """
+    Add new students' faces to their department shards (creating new shards).
+    The caller holds the training lock.
+    """
+    groups = group_by_department(faces, labels)
+    if groups is None:
+        print("⚠️ Skipping department shards: student departments unavailable")
+        return
+    for department, dept_faces, dept_labels in groups.values():
+        start = time.perf_counter()
+        shard_dir = get_shard_dir(department)
+        recognizer = create_recognizer()
+        previous = read_model_version(os.path.join(shard_dir, VERSION_FILE))
+        if model_exists(shard_dir):
+            recognizer.read(get_model_path(model_dir=shard_dir))
+            recognizer.update(dept_faces, np.array(dept_labels))
+        else:
+            recognizer.train(dept_faces, np.array(dept_labels))
+        version = save_model(recognizer, shard_dir, department=department,
+                             images=previous.get('images', 0) + len(dept_faces),
+                             students=previous.get('students', 0) + len(set(dept_labels)),
+                             training_seconds=round(time.perf_counter() - start, 3))
+        print(f"🏷️ Shard {department} updated (version {version})")
+
+
+def load_training_set(folder_paths, workers=None):
+    """
+    Load face crops and labels for the given student folders.
+    Folders are decoded and preprocessed concurrently on a thread pool
+    (OpenCV releases the GIL); results keep the input folder order.
+    """
+    workers = workers or Config.TRAINING_WORKERS
+
+    labelled = []
+    for folder_path in folder_paths:
+        folder_name = os.path.basename(os.path.normpath(folder_path))
         # Skip folder if no digits (label will fail)
-        if not any(char.isdigit() for char in folder_name):
+        label = label_from_folder(folder_name)
+        if label is None:
             print(f"⚠️ Skipping folder with no digits in name: {folder_name}")
             continue
+        labelled.append((folder_path, label))
+
+    faces = []
+    labels = []
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=LOADER_THREAD_PREFIX) as executor:
+        results = executor.map(load_folder_faces, [path for path, _ in labelled])
+        for (_, label), folder_faces in zip(labelled, results):
+            faces.extend(folder_faces)
+            labels.extend([label] * len(folder_faces))
+    return faces, labels
+
+
+def condense_training_set(faces, labels, per_student=None):
+    """
+    Optionally keep only a few representative images per student
+    (Config.FACE_PROTOTYPES_PER_STUDENT, 0 keeps every image).
+    Prediction cost grows with the number of stored images.
+    """
+    per_student = Config.FACE_PROTOTYPES_PER_STUDENT if per_student is None else per_student
+    if not per_student or len(faces) == 0:
+        return faces, labels
+
+    condensed_faces, condensed_labels = select_prototypes(faces, labels, per_student)
+    print(f"🧩 Condensed {len(faces)} images to {len(condensed_faces)} prototypes "
+          f"({per_student} per student)")
+    return condensed_faces, list(condensed_labels)
+
+
+def train_face_model(workers=None):
+    """
+    Full rebuild: train the model from every folder in student_images
+    """
+    with training_lock():
+        _train_full(workers)
 
-        label = int(''.join(filter(str.isdigit, folder_name)))
 
-        for image_name in os.listdir(folder_path):
-            img_path = os.path.join(folder_path, image_name)
-            img = Image.open(img_path).convert('L')
-            img_np = np.array(img, 'uint8')
+def _train_full(workers=None):
+    """Full rebuild; the caller holds the training lock"""
+    workers = workers or Config.TRAINING_WORKERS
+    print(f"🧠 Starting training with {workers} loader thread(s)...")
+    recognizer = create_recognizer()
 
-            faces.append(img_np)
-            labels.append(label)
+    folder_paths = [os.path.join(DATA_DIR, folder_name) for folder_name in sorted(os.listdir(DATA_DIR))]
+    folder_paths = [path for path in folder_paths if os.path.isdir(path)]
+
+    start = time.perf_counter()
+    faces, labels = load_training_set(folder_paths, workers)
+    faces, labels = condense_training_set(faces, labels)
+    load_seconds = time.perf_counter() - start
 
     if len(faces) == 0:
         print("❌ No images found to train.")
         return
 
+    start = time.perf_counter()
     recognizer.train(faces, np.array(labels))
-    os.makedirs('recognizer', exist_ok=True)
-    recognizer.save('recognizer/trainer.yml')
-    print("✅ Training complete. Model saved to recognizer/trainer.yml")
+    train_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    version = save_model(recognizer, images=len(faces), students=len(set(labels)),
+                         training_seconds=round(load_seconds + train_seconds, 3))
+    save_seconds = time.perf_counter() - start
+
+    print(f"⏱️ Loaded {len(faces)} images from {len(set(labels))} students in {load_seconds:.2f}s, "
+          f"trained in {train_seconds:.2f}s, saved in {save_seconds:.2f}s")
+    print(f"✅ Training complete. Model saved to {get_model_path()} (version {version})")
+
+    if Config.DEPARTMENT_SHARDS:
+        train_department_shards(faces, labels)
+
+
+def update_face_model(folder_paths):
+    """
+    Incremental enrollment: add new students' faces to the existing model
+    with LBPHFaceRecognizer.update() instead of retraining every student.
+    Accepts one folder path or a list of them.
+    Falls back to a full rebuild if no model has been trained yet.
+
+    Only the new faces are detected and turned into histograms, but the
+    current model is still read and the whole model written out as the
+    new version. With the numpy backend that is a memory-mapped read and a
+    binary write; the opencv backend parses and rewrites the full YAML,
+    which grows with the roster.
+    """
+    if isinstance(folder_paths, str):
+        folder_paths = [folder_paths]
+
+    start = time.perf_counter()
+    faces, labels = load_training_set(folder_paths)
+    faces, labels = condense_training_set(faces, labels)
+
+    if len(faces) == 0:
+        print("❌ No images found to add to the model.")
+        return
+
+    # The current model is read only once the lock is held, so an update
+    # published meanwhile by another worker is built upon, not overwritten
+    with training_lock():
+        if not model_exists():
+            print("⚠️ No existing model found, running full training")
+            return _train_full()
+
+        print(f"🧠 Updating model with {len(faces)} images for {len(set(labels))} student(s)...")
+        recognizer = create_recognizer()
+        recognizer.read(get_model_path())
+        recognizer.update(faces, np.array(labels))
+
+        previous = read_model_version()
+        version = save_model(
+            recognizer,
+            images=previous.get('images', 0) + len(faces),
+            students=previous.get('students', 0) + len(set(labels)),
+            training_seconds=round(time.perf_counter() - start, 3)
+        )
+        print(f"✅ Model updated (version {version})")
+
+        if Config.DEPARTMENT_SHARDS:
+            update_department_shards(faces, labels)
+
 
 if __name__ == "__main__":
-    train_face_model()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train the face recognition model")
+    parser.add_argument('--workers', type=int, default=None,
+                        help=f"Parallel image loader threads (default: {Config.TRAINING_WORKERS})")
+    parser.add_argument('--list-versions', action='store_true', help="List model versions in the registry")
+    parser.add_argument('--rollback', type=int, nargs='?', const=0, metavar='VERSION',
+                        help="Make an earlier model version current (default: the previous one)")
+    parser.add_argument('--department', help="Apply --list-versions/--rollback to a department shard")
+    args = parser.parse_args()
+
+    try:
+        model_dir = get_shard_dir(args.department) if args.department else MODEL_DIR
+    except ValueError as e:
+        parser.error(str(e))
+    if args.list_versions:
+        for metadata in list_versions(model_dir):
+            marker = '*' if metadata['current'] else ' '
+            print(f"{marker} v{metadata['version']:<4} {metadata['trained_at']}  {metadata['backend']:<6} "
+                  f"{metadata.get('students', '?')} students, {metadata.get('images', '?')} images, "
+                  f"{metadata.get('training_seconds', '?')}s")
+    elif args.rollback is not None:
+        rollback_model(model_dir, args.rollback or None)
+    else:
+        train_face_model(workers=args.workers)
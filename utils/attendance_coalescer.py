@@ -0,0 +1,138 @@
+import threading
+import time
+from config import Config
+from utils.attendance_utils import mark_attendance_status, mark_attendance_many
+
+
+class _PendingMark:
+    """One request's mark waiting for its batch to commit"""
+
+    def __init__(self, roll_no, method, marked_by):
+        self.roll_no = roll_no
+        self.method = method
+        self.marked_by = marked_by
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+        self.result = 'error'
+
+
+class AttendanceCoalescer:
+    """
+    Group-commit writer for attendance marks. Request threads queue their
+    mark and block; a single flusher thread collects marks for up to
+    window_ms (or max_batch marks) and commits them in one transaction on
+    one pooled connection, then hands every request its own result.
+    During the morning rush this keeps the kiosks from each holding a pool
+    connection for their own commit.
+    """
+
+    def __init__(self, window_ms=None, max_batch=None):
+        self.window = (Config.ATTENDANCE_COALESCE_WINDOW_MS if window_ms is None else window_ms) / 1000
+        self.max_batch = max_batch or Config.ATTENDANCE_COALESCE_MAX
+        self._cond = threading.Condition()
+        self._pending = []
+        self._thread = None
+
+        self._flushes = 0
+        self._marks = 0
+        self._largest_flush = 0
+        self._flush_seconds = 0.0
+        self._slowest_flush = 0.0
+        self._wait_seconds = 0.0
+        self._slowest_wait = 0.0
+        self._errors = 0
+        self._last_error = None
+
+    def _ensure_worker(self):
+        """Start the flusher thread on first use (caller holds the lock)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='attendance-flusher', daemon=True)
+            self._thread.start()
+
+    def mark(self, roll_no, method='Face', marked_by='System'):
+        """
+        Mark attendance through the next batch. Blocks until the batch has
+        committed and returns 'marked', 'already_marked', 'not_found', or
+        'error' if the batch failed and nothing was written for it.
+        """
+        if not Config.ATTENDANCE_COALESCE:
+            return mark_attendance_status(roll_no, method=method, marked_by=marked_by)
+
+        pending = _PendingMark(roll_no, method, marked_by)
+        with self._cond:
+            self._pending.append(pending)
+            self._ensure_worker()
+            self._cond.notify()
+        pending.done.wait()
+        return pending.result
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # Give concurrent requests the window to join this batch
+                deadline = time.perf_counter() + self.window
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+
+            self._flush(batch)
+
+    def _flush(self, batch):
+        start = time.perf_counter()
+        error = None
+        try:
+            results = mark_attendance_many([(p.roll_no, p.method, p.marked_by) for p in batch])
+        except Exception as e:
+            # The transaction was rolled back; retry one by one so a single bad mark
+            # (e.g. a student deleted but still in the roster cache) fails alone
+            error = str(e)
+            print(f"❌ Attendance flush of {len(batch)} mark(s) failed, retrying individually: {e}")
+            results = [mark_attendance_status(p.roll_no, method=p.method, marked_by=p.marked_by) for p in batch]
+        finished = time.perf_counter()
+
+        for pending, result in zip(batch, results):
+            pending.result = result
+            pending.done.set()
+
+        with self._cond:
+            self._flushes += 1
+            self._marks += len(batch)
+            self._largest_flush = max(self._largest_flush, len(batch))
+            self._flush_seconds += finished - start
+            self._slowest_flush = max(self._slowest_flush, finished - start)
+            for pending in batch:
+                self._wait_seconds += finished - pending.submitted
+                self._slowest_wait = max(self._slowest_wait, finished - pending.submitted)
+            if error:
+                self._errors += 1
+                self._last_error = error
+
+    def stats(self):
+        """Flush size and latency statistics for tuning the window"""
+        with self._cond:
+            return {
+                'enabled': Config.ATTENDANCE_COALESCE,
+                'window_ms': self.window * 1000,
+                'max_batch': self.max_batch,
+                'queued': len(self._pending),
+                'flushes': self._flushes,
+                'marks': self._marks,
+                'avg_flush_size': round(self._marks / self._flushes, 2) if self._flushes else 0.0,
+                'largest_flush': self._largest_flush,
+                'avg_flush_ms': round(self._flush_seconds / self._flushes * 1000, 2) if self._flushes else 0.0,
+                'slowest_flush_ms': round(self._slowest_flush * 1000, 2),
+                'avg_wait_ms': round(self._wait_seconds / self._marks * 1000, 2) if self._marks else 0.0,
+                'slowest_wait_ms': round(self._slowest_wait * 1000, 2),
+                'failed_flushes': self._errors,
+                'last_error': self._last_error
+            }
+
+
+# Shared instance used by the Flask routes
+attendance_coalescer = AttendanceCoalescer()
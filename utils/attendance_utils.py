@@ -1,83 +1,87 @@
 import mysql.connector
+from mysql.connector import errorcode
 from datetime import datetime, date, timedelta
 from db_config import get_connection
+from utils.roster_cache import roster_cache
 import csv
 import os
 
 
-def mark_attendance(roll_no, method='Face', marked_by='System'):
+def get_attendance_status(time_now):
     """
-    Mark attendance for a student with enhanced tracking
+    Determine status based on time (assuming class starts at 9:00 AM)
     """
-    conn = None
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
+    if time_now.hour > 9 or (time_now.hour == 9 and time_now.minute > 15):
+        return 'Late'
+    return 'Present'
+
 
-        date_today = datetime.now().date()
-        time_now = datetime.now().time()
+def mark_attendance(roll_no, method='Face', marked_by='System'):
+    """
+    Mark attendance for a student with enhanced tracking.
+    Returns True if the student was newly marked.
+    """
+    return mark_attendance_status(roll_no, method, marked_by) == 'marked'
 
-        # Get student ID first
-        cursor.execute("SELECT id, name FROM students WHERE roll_no = %s", (roll_no,))
-        student = cursor.fetchone()
 
+def mark_attendance_status(roll_no, method='Face', marked_by='System'):
+    """
+    Mark attendance for a student and report the outcome:
+    'marked', 'already_marked', 'not_found' or 'error' (nothing written).
+    The roll number is resolved through the roster cache, and the
+    unique_attendance (student_id, date) key decides whether the mark is
+    new: the insert's affected-row count tells us if the student was
+    already marked, so a mark is two statements (attendance + log).
+    """
+    conn = None
+    cursor = None
+    try:
+        student = roster_cache.get_by_roll(roll_no)
         if not student:
             print(f"❌ Student with roll number {roll_no} not found in DB.")
-            return False
-
-        student_id, student_name = student
-        print(f"📝 Found student: {student_name} (ID: {student_id}, Roll: {roll_no})")
+            return 'not_found'
 
-        # Check if already marked
-        cursor.execute("""
-            SELECT * FROM attendance 
-            WHERE student_id = %s AND date = %s
-        """, (student_id, date_today))
-
-        existing = cursor.fetchone()
-        if existing:
-            print(f"🟡 Attendance already marked for {roll_no} ({student_name}) on {date_today}")
-            cursor.close()
-            conn.close()
-            return False
-
-        # Determine status based on time (assuming class starts at 9:00 AM)
-        status = 'Present'
-        if time_now.hour > 9 or (time_now.hour == 9 and time_now.minute > 15):
-            status = 'Late'
+        conn = get_connection()
+        cursor = conn.cursor()
 
-        print(f"⏰ Marking attendance - Status: {status}, Time: {time_now}")
+        now = datetime.now()
+        date_today = now.date()
+        time_now = now.time()
+        status = get_attendance_status(time_now)
 
+        # A duplicate (student_id, date) updates nothing and affects 0 rows; unlike
+        # INSERT IGNORE, any other error (e.g. a deleted student's foreign key) still raises
         cursor.execute("""
                        INSERT INTO attendance (student_id, date, time, status, marked_by, method)
                        VALUES (%s, %s, %s, %s, %s, %s)
-                       """, (student_id, date_today, time_now, status, marked_by, method))
+                       ON DUPLICATE KEY UPDATE id = id
+                       """, (student.id, date_today, time_now, status, marked_by, method))
+
+        if cursor.rowcount == 0:
+            conn.rollback()
+            print(f"🟡 Attendance already marked for {roll_no} ({student.name}) on {date_today}")
+            return 'already_marked'
 
         # Log the attendance action
-        cursor.execute("""
-                       INSERT INTO attendance_logs (student_id, action)
-                       VALUES (%s, %s)
-                       """, (student_id, f"Attendance marked: {status} via {method}"))
+        cursor.execute("INSERT INTO attendance_logs (student_id, action) VALUES (%s, %s)",
+                       (student.id, f"Attendance marked: {status} via {method}"))
 
         conn.commit()
-        print(f"✅ Attendance marked successfully for {roll_no} ({student_name}) - Status: {status}")
-
-        cursor.close()
-        conn.close()
-        return True
+        print(f"✅ Attendance marked successfully for {roll_no} - Status: {status}, Time: {time_now}")
+        return 'marked'
 
     except mysql.connector.Error as err:
         print(f"❌ Database Error in mark_attendance: {err}")
         if conn:
             conn.rollback()
-        return False
+        return 'error'
     except Exception as e:
         print(f"❌ Unexpected Error in mark_attendance: {e}")
         import traceback
         traceback.print_exc()
         if conn:
             conn.rollback()
-        return False
+        return 'error'
     finally:
         if conn:
             try:
@@ -88,6 +92,186 @@ def mark_attendance(roll_no, method='Face', marked_by='System'):
                 pass
 
 
+def _in_transaction(name, work, attempts=2):
+    """
+    Run work(cursor) in one transaction on a pooled connection and commit.
+    Database errors roll back and are re-raised; a deadlock (two batches
+    locking overlapping marks) is retried once.
+    """
+    for attempt in range(attempts):
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            result = work(cursor)
+            conn.commit()
+            return result
+        except mysql.connector.Error as err:
+            conn.rollback()
+            if err.errno == errorcode.ER_LOCK_DEADLOCK and attempt + 1 < attempts:
+                print(f"⚠️ Deadlock in {name}, retrying")
+                continue
+            print(f"❌ Database Error in {name}: {err}")
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+
+def _mark_resolved_students(cursor, students, method, marked_by):
+    """
+    Mark resolved students (rows of id, name, roll_no) inside the caller's
+    transaction: one locking SELECT for today's existing marks, then the
+    attendance and log rows with one executemany each.
+    Returns (set of already-marked student ids, attendance status).
+    """
+    now = datetime.now()
+    date_today = now.date()
+    time_now = now.time()
+    status = get_attendance_status(time_now)
+    if not students:
+        return set(), status
+
+    student_ids = [row[0] for row in students]
+    placeholders = ', '.join(['%s'] * len(student_ids))
+    # FOR UPDATE reads the latest committed marks and locks the unique key
+    # entries (gaps included), so no other transaction can mark these
+    # students between this check and the insert below
+    cursor.execute(f"""
+        SELECT student_id FROM attendance
+        WHERE date = %s AND student_id IN ({placeholders})
+        FOR UPDATE
+    """, (date_today, *student_ids))
+    already_marked = {row[0] for row in cursor.fetchall()}
+
+    to_mark = [student_id for student_id in student_ids if student_id not in already_marked]
+    if to_mark:
+        cursor.executemany("""
+                           INSERT INTO attendance (student_id, date, time, status, marked_by, method)
+                           VALUES (%s, %s, %s, %s, %s, %s)
+                           ON DUPLICATE KEY UPDATE id = id
+                           """, [(student_id, date_today, time_now, status, marked_by, method)
+                                 for student_id in to_mark])
+        cursor.executemany("""
+                           INSERT INTO attendance_logs (student_id, action)
+                           VALUES (%s, %s)
+                           """, [(student_id, f"Attendance marked: {status} via {method}")
+                                 for student_id in to_mark])
+    return already_marked, status
+
+
+def mark_attendance_bulk_by_id(student_ids, method='Face', marked_by='System'):
+    """
+    Mark attendance for many students (by students.id) in one transaction.
+    Returns dict mapping student_id to {'status': 'marked' | 'already_marked' |
+    'not_found', plus name/roll_no/attendance status when known}.
+    """
+    student_ids = list(dict.fromkeys(int(i) for i in student_ids))
+    outcomes = {student_id: {'status': 'not_found'} for student_id in student_ids}
+    if not student_ids:
+        return outcomes
+
+    entries = [roster_cache.get_by_id(student_id) for student_id in student_ids]
+    students = [(entry.id, entry.name, entry.roll_no) for entry in entries if entry]
+
+    already_marked, status = _in_transaction(
+        'mark_attendance_bulk_by_id',
+        lambda cursor: _mark_resolved_students(cursor, students, method, marked_by))
+
+    for student_id, name, roll_no in students:
+        outcomes[student_id] = {
+            'status': 'already_marked' if student_id in already_marked else 'marked',
+            'name': name,
+            'roll_no': roll_no,
+            'attendance_status': status if student_id not in already_marked else None
+        }
+
+    print(f"✅ Bulk attendance: {len(students) - len(already_marked)} marked, {len(already_marked)} "
+          f"already marked, {len(student_ids) - len(students)} not found")
+    return outcomes
+
+
+def mark_attendance_bulk(roll_nos, method='Manual', marked_by='System'):
+    """
+    Mark attendance for many students by roll number in one transaction:
+    the roster cache resolves every roll number, then attendance and log
+    rows are inserted in bulk.
+    Returns dict mapping roll_no to {'status': 'marked' | 'already_marked' |
+    'not_found', plus student_id/name/attendance status when known}.
+    """
+    # Roll numbers compare case-insensitively in MySQL, so duplicates differing only in case collapse
+    unique = {}
+    for roll in roll_nos:
+        roll = str(roll).strip()
+        if roll:
+            unique.setdefault(roll.lower(), roll)
+    roll_nos = list(unique.values())
+    outcomes = {roll_no: {'status': 'not_found'} for roll_no in roll_nos}
+    if not roll_nos:
+        return outcomes
+
+    entries = [roster_cache.get_by_roll(roll_no) for roll_no in roll_nos]
+    students = [(entry.id, entry.name, entry.roll_no) for entry in entries if entry]
+
+    already_marked, status = _in_transaction(
+        'mark_attendance_bulk',
+        lambda cursor: _mark_resolved_students(cursor, students, method, marked_by))
+
+    for student_id, name, roll_no in students:
+        # Report under the caller's spelling of the roll number
+        outcomes[unique.get(roll_no.lower(), roll_no)] = {
+            'status': 'already_marked' if student_id in already_marked else 'marked',
+            'student_id': student_id,
+            'name': name,
+            'roll_no': roll_no,
+            'attendance_status': status if student_id not in already_marked else None
+        }
+
+    print(f"✅ Bulk attendance: {len(students) - len(already_marked)} marked, {len(already_marked)} "
+          f"already marked, {len(roll_nos) - len(students)} not found")
+    return outcomes
+
+
+def mark_attendance_many(marks):
+    """
+    Mark a batch of individual requests, each (roll_no, method, marked_by),
+    in one transaction. Used by the attendance coalescer to commit marks
+    from concurrent requests together.
+    Returns the outcome of each request in the order of marks: 'marked',
+    'already_marked' or 'not_found' (as mark_attendance_status reports).
+    Database errors are raised; nothing in the batch is written then.
+    """
+    if not marks:
+        return []
+
+    # Requests with the same method and marker are inserted together; the
+    # transaction sees its own earlier inserts, so later groups skip them
+    groups = {}
+    for i, (roll_no, method, marked_by) in enumerate(marks):
+        student = roster_cache.get_by_roll(roll_no)
+        if student:
+            groups.setdefault((method, marked_by), []).append((i, student))
+
+    def mark_groups(cursor):
+        results = ['not_found'] * len(marks)
+        newly_marked = set()
+        for (method, marked_by), requests in groups.items():
+            group_students = list({student.id: student for _, student in requests}.values())
+            already_marked, _ = _mark_resolved_students(cursor, group_students, method, marked_by)
+            for i, student in requests:
+                # The first request for a student gets the mark, repeats in the batch do not
+                if student.id not in already_marked and student.id not in newly_marked:
+                    newly_marked.add(student.id)
+                    results[i] = 'marked'
+                else:
+                    results[i] = 'already_marked'
+        return results
+
+    results = _in_transaction('mark_attendance_many', mark_groups)
+    print(f"✅ Attendance batch: {results.count('marked')} of {len(marks)} request(s) marked, "
+          f"{results.count('not_found')} not found")
+    return results
+
+
 def get_attendance_report(start_date=None, end_date=None, export=False):
     """
     Get attendance report with date range filtering
@@ -0,0 +1,117 @@
+import cv2
+import hashlib
+import json
+import numpy as np
+import os
+import threading
+from config import Config
+from utils.face_utils import detect_faces, preprocess_face
+
+CACHE_DIR = os.path.join('recognizer', 'face_cache')
+FACE_SIZE = 200
+
+# One lock per student folder so different folders can be cached concurrently
+_folder_locks = {}
+_folder_locks_guard = threading.Lock()
+
+
+def _folder_lock(npy_path):
+    with _folder_locks_guard:
+        return _folder_locks.setdefault(npy_path, threading.Lock())
+
+
+def _file_hash(path):
+    """SHA-1 of the raw image bytes, used as the cache key"""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _cache_paths(folder_path):
+    """Return (crops .npy path, index .json path) for a student folder"""
+    folder_name = os.path.basename(os.path.normpath(folder_path))
+    return (os.path.join(CACHE_DIR, f"{folder_name}.npy"),
+            os.path.join(CACHE_DIR, f"{folder_name}.json"))
+
+
+def _is_training_image(folder_path, image_name):
+    """Only raw captures are training images; the generated QR code is not a face"""
+    if image_name == 'qr_code.png':
+        return False
+    ext = image_name.rsplit('.', 1)[-1].lower() if '.' in image_name else ''
+    return ext in Config.ALLOWED_EXTENSIONS and os.path.isfile(os.path.join(folder_path, image_name))
+
+
+def extract_face(gray_img):
+    """
+    Crop and preprocess the largest detected face exactly as recognize_face does.
+    Images with no detectable face (e.g. already-cropped captures) are used whole.
+    """
+    faces = detect_faces(gray_img)
+    if len(faces) > 0:
+        x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+        gray_img = gray_img[y:y + h, x:x + w]
+    return preprocess_face(gray_img)
+
+
+def cache_student_faces(folder_path):
+    """
+    Bring the packed crop store of one student folder up to date.
+    Only images whose content hash is not cached yet are decoded.
+    Returns a read-only memory-mapped uint8 array of shape (N, 200, 200).
+    """
+    npy_path, index_path = _cache_paths(folder_path)
+
+    with _folder_lock(npy_path):
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                cached_hashes = json.load(f).get('hashes', [])
+        except (OSError, ValueError):
+            cached_hashes = []
+
+        current = {}
+        for image_name in sorted(os.listdir(folder_path)):
+            if _is_training_image(folder_path, image_name):
+                img_path = os.path.join(folder_path, image_name)
+                current.setdefault(_file_hash(img_path), img_path)
+
+        if list(current) == cached_hashes and os.path.exists(npy_path):
+            return np.load(npy_path, mmap_mode='r')
+
+        # Read the old store fully (not mapped) so it can be replaced on any OS
+        try:
+            crops = np.load(npy_path) if cached_hashes else None
+        except (OSError, ValueError):
+            crops = None
+
+        row_of = {h: i for i, h in enumerate(cached_hashes)}
+        rows = []
+        hashes = []
+        decoded = 0
+        for file_hash, img_path in current.items():
+            if crops is not None and file_hash in row_of:
+                rows.append(crops[row_of[file_hash]])
+            else:
+                img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+                if img is None:
+                    print(f"⚠️ Skipping unreadable image: {img_path}")
+                    continue
+                rows.append(extract_face(img))
+                decoded += 1
+            hashes.append(file_hash)
+
+        packed = (np.stack(rows) if rows
+                  else np.empty((0, FACE_SIZE, FACE_SIZE), dtype=np.uint8))
+
+        # Write to temporary files and swap so readers never see a partial store
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_npy = f"{npy_path}.tmp.npy"
+        np.save(tmp_npy, packed)
+        os.replace(tmp_npy, npy_path)
+        tmp_index = f"{index_path}.tmp"
+        with open(tmp_index, 'w', encoding='utf-8') as f:
+            json.dump({'hashes': hashes}, f)
+        os.replace(tmp_index, index_path)
+
+        print(f"🗂️ Face cache for {os.path.basename(os.path.normpath(folder_path))}: "
+              f"{len(hashes)} crops ({decoded} newly processed)")
+        return np.load(npy_path, mmap_mode='r')
@@ -0,0 +1,102 @@
+import threading
+import time
+import cv2
+from config import Config
+
+# Messages shown on the kiosk for each rejection reason
+REJECTION_MESSAGES = {
+    'too_small': 'Face too small - please move closer to the camera',
+    'too_dark': 'Image too dark - please improve the lighting',
+    'too_bright': 'Image overexposed - please avoid direct light on the camera',
+    'blurry': 'Image too blurry - please hold still'
+}
+
+# Crops are scaled to this size before measuring sharpness so the
+# Laplacian variance does not depend on how large the face appears
+SHARPNESS_SIZE = (64, 64)
+
+
+def assess_face_quality(face, min_size=None):
+    """
+    Cheap quality check of a detected grayscale face crop, run before
+    preprocess_face/predict. Returns (reason or None, metrics).
+    """
+    min_size = Config.FACE_QUALITY_MIN_SIZE if min_size is None else min_size
+    h, w = face.shape[:2]
+    metrics = {'size': int(min(w, h))}
+    if min(w, h) < min_size:
+        return 'too_small', metrics
+
+    brightness = float(face.mean())
+    metrics['brightness'] = round(brightness, 1)
+    if brightness < Config.FACE_MIN_BRIGHTNESS:
+        return 'too_dark', metrics
+    if brightness > Config.FACE_MAX_BRIGHTNESS:
+        return 'too_bright', metrics
+
+    small = cv2.resize(face, SHARPNESS_SIZE, interpolation=cv2.INTER_AREA)
+    sharpness = float(cv2.Laplacian(small, cv2.CV_64F).var())
+    metrics['sharpness'] = round(sharpness, 1)
+    if sharpness < Config.FACE_MIN_SHARPNESS:
+        return 'blurry', metrics
+    return None, metrics
+
+
+class QualityGate:
+    """
+    Applies assess_face_quality and keeps running statistics: rejection
+    rate per reason and the estimated CPU time saved, i.e. the average
+    preprocess + predict cost of accepted faces times the number rejected,
+    minus the time spent in the gate itself.
+    """
+
+    def __init__(self, log_every=100):
+        self.log_every = log_every
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.rejected = {}
+        self.gate_seconds = 0.0
+        self.predicted = 0
+        self.predict_seconds = 0.0
+
+    def check(self, face, min_size=None):
+        """Return the rejection reason for a face crop, or None if it should be predicted"""
+        if not Config.FACE_QUALITY_GATE:
+            return None
+        start = time.perf_counter()
+        reason, _ = assess_face_quality(face, min_size)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.checked += 1
+            self.gate_seconds += elapsed
+            if reason:
+                self.rejected[reason] = self.rejected.get(reason, 0) + 1
+            should_log = self.log_every and self.checked % self.log_every == 0
+        if should_log:
+            stats = self.stats()
+            print(f"🧪 Quality gate: {stats['rejection_rate']:.0%} of {stats['checked']} faces rejected "
+                  f"{stats['rejected']}, ~{stats['cpu_seconds_saved']:.2f}s CPU saved")
+        return reason
+
+    def record_prediction(self, seconds, count=1):
+        """Record the preprocess + predict time spent on count accepted faces"""
+        with self._lock:
+            self.predicted += count
+            self.predict_seconds += seconds
+
+    def stats(self):
+        with self._lock:
+            rejected = sum(self.rejected.values())
+            avg_predict = self.predict_seconds / self.predicted if self.predicted else 0.0
+            return {
+                'enabled': Config.FACE_QUALITY_GATE,
+                'checked': self.checked,
+                'rejected': dict(self.rejected),
+                'rejection_rate': rejected / self.checked if self.checked else 0.0,
+                'avg_gate_ms': self.gate_seconds / self.checked * 1000 if self.checked else 0.0,
+                'avg_predict_ms': avg_predict * 1000,
+                'cpu_seconds_saved': max(0.0, rejected * avg_predict - self.gate_seconds)
+            }
+
+
+quality_gate = QualityGate()
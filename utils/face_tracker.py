@@ -0,0 +1,107 @@
+import itertools
+
+
+def box_iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+class Track:
+    """One face followed across frames, with its cached identity"""
+
+    def __init__(self, track_id, box, frame_index):
+        self.track_id = track_id
+        self.box = box
+        self.student_id = None
+        self.confidence = None
+        self.last_seen = frame_index
+        self.last_predicted = None
+
+
+class FaceTracker:
+    """
+    Lightweight IoU tracker that associates face boxes between frames so a
+    face's identity is predicted once and reused while it stays in view.
+    A track is re-predicted every repredict_interval frames, or every
+    retry_interval frames while unidentified or matched with a distance
+    at or above low_confidence.
+    """
+
+    def __init__(self, iou_threshold=0.3, repredict_interval=30, retry_interval=3,
+                 low_confidence=50, max_missed=10):
+        self.iou_threshold = iou_threshold
+        self.repredict_interval = repredict_interval
+        self.retry_interval = retry_interval
+        self.low_confidence = low_confidence
+        self.max_missed = max_missed
+        self.tracks = []
+        self._ids = itertools.count(1)
+        self.predictions = 0
+        self.skipped = 0
+
+    def update(self, boxes, frame_index):
+        """
+        Associate this frame's boxes with existing tracks (greedy by IoU),
+        start tracks for new faces and drop tracks not seen for max_missed frames.
+        Returns list of (track, needs_prediction) for the boxes of this frame.
+        """
+        pairs = sorted(
+            ((box_iou(track.box, box), t, b)
+             for t, track in enumerate(self.tracks) for b, box in enumerate(boxes)),
+            reverse=True
+        )
+        matched_tracks, matched_boxes = set(), {}
+        for iou, t, b in pairs:
+            if iou < self.iou_threshold:
+                break
+            if t in matched_tracks or b in matched_boxes:
+                continue
+            matched_tracks.add(t)
+            matched_boxes[b] = self.tracks[t]
+
+        results = []
+        for b, box in enumerate(boxes):
+            track = matched_boxes.get(b)
+            if track is None:
+                track = Track(next(self._ids), box, frame_index)
+                self.tracks.append(track)
+            track.box = box
+            track.last_seen = frame_index
+            needs = self._needs_prediction(track, frame_index)
+            if needs:
+                self.predictions += 1
+            else:
+                self.skipped += 1
+            results.append((track, needs))
+
+        self.tracks = [t for t in self.tracks if frame_index - t.last_seen <= self.max_missed]
+        return results
+
+    def _needs_prediction(self, track, frame_index):
+        if track.last_predicted is None:
+            return True
+        since = frame_index - track.last_predicted
+        uncertain = track.student_id is None or track.confidence >= self.low_confidence
+        return since >= (self.retry_interval if uncertain else self.repredict_interval)
+
+    def set_identity(self, track, student_id, confidence, frame_index):
+        """Record a fresh prediction for a track"""
+        track.student_id = student_id
+        track.confidence = confidence
+        track.last_predicted = frame_index
+
+    def stats(self):
+        """Share of face observations answered from the track cache"""
+        total = self.predictions + self.skipped
+        return {
+            'active_tracks': len(self.tracks),
+            'predictions': self.predictions,
+            'skipped': self.skipped,
+            'skip_rate': self.skipped / total if total else 0.0
+        }
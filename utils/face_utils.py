@@ -5,22 +5,102 @@ import os
 import qrcode
 from io import BytesIO
 import base64
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from utils.model_cache import recognizer_cache, get_shard_cache, shard_info, department_slug
+from utils.face_quality import quality_gate, REJECTION_MESSAGES
+from utils.recognition_client import recognition_client
+
+CASCADE_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+
+# cv2.imdecode flags that decode JPEGs straight to grayscale at reduced scale
+REDUCED_GRAYSCALE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
 
 # Load Haar Cascade
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
+
+# CascadeClassifier is not safe to share between threads. Training loader
+# threads (named with this prefix) keep their own for the whole run; request
+# threads, which Flask starts per request, borrow one from a bounded pool so
+# the XML is parsed at most CASCADE_POOL_SIZE times per process.
+LOADER_THREAD_PREFIX = 'face-loader'
+_thread_local = threading.local()
+_cascade_pool = queue.Queue()
+_cascade_pool_lock = threading.Lock()
+_cascades_created = 0
+
+
+@contextmanager
+def _borrow_cascade():
+    """Yield a Haar cascade the calling thread may use exclusively"""
+    thread = threading.current_thread()
+    if thread is threading.main_thread():
+        yield face_cascade
+        return
+    if thread.name.startswith(LOADER_THREAD_PREFIX):
+        cascade = getattr(_thread_local, 'cascade', None)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(CASCADE_PATH)
+            _thread_local.cascade = cascade
+        yield cascade
+        return
+
+    global _cascades_created
+    try:
+        cascade = _cascade_pool.get_nowait()
+    except queue.Empty:
+        with _cascade_pool_lock:
+            create = _cascades_created < max(1, Config.CASCADE_POOL_SIZE)
+            if create:
+                _cascades_created += 1
+        cascade = cv2.CascadeClassifier(CASCADE_PATH) if create else _cascade_pool.get()
+    try:
+        yield cascade
+    finally:
+        _cascade_pool.put(cascade)
 
-def detect_faces(gray_img):
+
+def detect_faces(gray_img, max_side=None):
     """
     Detect faces from a grayscale image using Haar Cascade.
+    Large images are scanned on a downscaled copy whose longest side is at
+    most max_side (default Config.FACE_DETECTION_MAX_SIDE, 0 disables), and
+    the boxes are mapped back to original-resolution coordinates.
     Returns list of face regions (x, y, w, h).
     """
-    faces = face_cascade.detectMultiScale(
-        gray_img,
-        scaleFactor=1.1,
-        minNeighbors=5,
-        minSize=(30, 30),
-        flags=cv2.CASCADE_SCALE_IMAGE
-    )
+    if max_side is None:
+        max_side = Config.FACE_DETECTION_MAX_SIDE
+
+    height, width = gray_img.shape[:2]
+    scale = 1.0
+    if max_side and max(height, width) > max_side:
+        scale = max_side / float(max(height, width))
+        gray_img = cv2.resize(gray_img, (max(1, int(width * scale)), max(1, int(height * scale))),
+                              interpolation=cv2.INTER_AREA)
+
+    min_w, min_h = Config.MIN_FACE_SIZE
+    with _borrow_cascade() as cascade:
+        faces = cascade.detectMultiScale(
+            gray_img,
+            scaleFactor=Config.FACE_DETECTION_SCALE_FACTOR,
+            minNeighbors=Config.FACE_DETECTION_MIN_NEIGHBORS,
+            # Haar cascade window is 24x24, so never ask for smaller faces
+            minSize=(max(24, int(min_w * scale)), max(24, int(min_h * scale))),
+            flags=cv2.CASCADE_SCALE_IMAGE
+        )
+
+    if scale != 1.0 and len(faces) > 0:
+        faces = np.round(np.asarray(faces) / scale).astype(int)
+        faces[:, 2] = np.minimum(faces[:, 2], width - faces[:, 0])
+        faces[:, 3] = np.minimum(faces[:, 3], height - faces[:, 1])
     return faces
 
 
@@ -92,35 +172,199 @@ def capture_faces_from_webcam(folder_path, count=30):
     print(f"✅ Face capture complete. Total images: {captured}")
     return captured
 
-def recognize_face(image_file):
+def read_upload(image_file):
     """
-    Recognizes a face from an uploaded image file.
-    Returns dict with student info if recognized, otherwise None.
+    Return the raw bytes of an uploaded file object, path or bytes, reading
+    the upload once. File objects are rewound so they can still be saved.
     """
-    try:
-        # Check if model exists
-        model_path = "recognizer/trainer.yml"
-        if not os.path.exists(model_path) or os.path.getsize(model_path) == 0:
-            return {
-                'success': False,
-                'message': 'Model not trained. Please train the model first.',
-                'student_id': None,
-                'confidence': 0
-            }
+    if isinstance(image_file, (bytes, bytearray, memoryview)):
+        return bytes(image_file)
+    if isinstance(image_file, str):
+        with open(image_file, 'rb') as f:
+            return f.read()
+    image_file.seek(0)
+    data = image_file.read()
+    image_file.seek(0)
+    return data
+
+
+def image_header(data):
+    """
+    Return (format, width, height) parsed from the image header only;
+    no pixel data is decoded.
+    """
+    with Image.open(BytesIO(data)) as img:
+        return img.format, img.width, img.height
+
+
+def decode_grayscale(data, min_side=None, header=None):
+    """
+    Decode image bytes straight to a grayscale array in one pass. Large JPEGs
+    are decoded at 1/2, 1/4 or 1/8 scale by libjpeg itself, as far as the
+    longest side stays at least min_side (0 = always full resolution).
+    """
+    min_side = Config.UPLOAD_DECODE_MIN_SIDE if min_side is None else min_side
+    flag = cv2.IMREAD_GRAYSCALE
+    if min_side:
+        image_format, width, height = header or image_header(data)
+        # Other formats would be decoded at full size and resized anyway
+        if image_format == 'JPEG':
+            for factor, reduced_flag in REDUCED_GRAYSCALE_FLAGS:
+                if max(width, height) // factor >= min_side:
+                    flag = reduced_flag
+                    break
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if img is None:
+        raise ValueError("Could not decode image")
+    return img
+
+
+def read_grayscale(image_file, min_side=None):
+    """
+    Read an image path or uploaded file object as a grayscale array
+    """
+    if isinstance(image_file, str):
+        return cv2.imread(image_file, cv2.IMREAD_GRAYSCALE)
+    return decode_grayscale(read_upload(image_file), min_side)
+
+
+def classify_match(student_id, confidence):
+    """
+    Turn a raw LBPH prediction into a recognition result.
+    Lower confidence value means better match.
+    """
+    # Threshold: confidence < 100 is acceptable (very relaxed for poor conditions)
+    if confidence < 40:
+        # Excellent match
+        return {
+            'success': True,
+            'message': 'Face recognized successfully with high confidence',
+            'student_id': student_id,
+            'confidence': round(100 - confidence, 2),
+            'match_quality': 'High'
+        }
+    elif confidence < 70:
+        # Good match
+        return {
+            'success': True,
+            'message': 'Face recognized successfully',
+            'student_id': student_id,
+            'confidence': round(100 - confidence, 2),
+            'match_quality': 'Medium'
+        }
+    elif confidence < 100:
+        # Acceptable match (relaxed threshold)
+        return {
+            'success': True,
+            'message': 'Face recognized with acceptable confidence',
+            'student_id': student_id,
+            'confidence': round(100 - confidence, 2),
+            'match_quality': 'Acceptable'
+        }
+    else:
+        # Poor match
+        return {
+            'success': False,
+            'message': f'Face not recognized with sufficient confidence (confidence: {confidence:.1f}). Please ensure good lighting and clear face. Try: 1) Turn on all lights 2) Face camera directly 3) Move closer 4) Or use QR method instead.',
+            'student_id': None,
+            'confidence': round(100 - confidence, 2),
+            'raw_confidence': confidence
+        }
 
-        # Load recognizer model
-        recognizer = cv2.face.LBPHFaceRecognizer_create()
-        recognizer.read(model_path)
 
+def get_recognizers(department=None):
+    """
+    Recognizers to try in order: the department shard (if one is trained
+    for this department) followed by the global model.
+    Returns list of (model name, recognizer).
+    """
+    department = department or Config.KIOSK_DEPARTMENT
+    recognizers = []
+    shard_cache = get_shard_cache(department) if department else None
+    if shard_cache is not None:
+        shard = shard_cache.get()
+        if shard is not None:
+            recognizers.append((f"shard:{department_slug(department)}", shard))
+    recognizer = recognizer_cache.get()
+    if recognizer is not None:
+        recognizers.append(('global', recognizer))
+    return recognizers
+
+
+def predict_crops(recognizer, crops):
+    """
+    Predict preprocessed face crops with one recognizer.
+    Returns list of (student_id, confidence).
+    """
+    if hasattr(recognizer, 'predict_batch'):
+        # NumPy backend matches all faces in one vectorised pass
+        labels, distances = recognizer.predict_batch(crops)
+        return list(zip(labels.tolist(), distances.tolist()))
+    if len(crops) == 1:
+        return [recognizer.predict(crops[0])]
+    with ThreadPoolExecutor(max_workers=Config.RECOGNITION_WORKERS) as executor:
+        return list(executor.map(recognizer.predict, crops))
+
+
+def match_crops(crops, recognizers):
+    """
+    Match preprocessed face crops against recognizers in order, passing only
+    the faces a model did not recognize on to the next one.
+    Returns list of (student_id, confidence, model name) per crop.
+    """
+    matches = [None] * len(crops)
+    pending = list(range(len(crops)))
+    for model_name, recognizer in recognizers:
+        if not pending:
+            break
+        predictions = predict_crops(recognizer, [crops[i] for i in pending])
+        misses = []
+        for i, (student_id, confidence) in zip(pending, predictions):
+            matches[i] = (int(student_id), float(confidence), model_name)
+            if not classify_match(student_id, confidence)['success']:
+                misses.append(i)
+        pending = misses
+    return matches
+
+
+def match_faces(crops, department=None):
+    """
+    Match preprocessed face crops through the recognition service when one is
+    configured, falling back to the in-process recognizers if it is unreachable.
+    Returns list of (student_id, confidence, model name), or None if no model is trained.
+    """
+    if Config.RECOGNITION_SERVICE:
+        matches = recognition_client.match(crops, department)
+        if matches is not None:
+            return matches
+    # Shared recognizers, reloaded only when the trained model changes
+    recognizers = get_recognizers(department)
+    if not recognizers:
+        return None
+    return match_crops(crops, recognizers)
+
+
+def recognize_face(image_file, department=None, timings=None):
+    """
+    Recognizes a face from an uploaded image file (path, file object or bytes).
+    If a department is given (or Config.KIOSK_DEPARTMENT is set) its shard is
+    searched first, falling back to the global model on a miss. With
+    Config.RECOGNITION_SERVICE set, only detection runs here and matching
+    goes to the recognition service.
+    If a timings dict is passed, decode_ms, detect_ms and match_ms are stored in it.
+    Returns dict with student info if recognized, otherwise None.
+    """
+    timings = {} if timings is None else timings
+    try:
         # Read uploaded image
-        if isinstance(image_file, str):
-            img = cv2.imread(image_file, cv2.IMREAD_GRAYSCALE)
-        else:
-            img = Image.open(image_file).convert('L')  # Grayscale
-            img = np.array(img, 'uint8')
+        start = time.perf_counter()
+        img = read_grayscale(image_file)
+        timings['decode_ms'] = round((time.perf_counter() - start) * 1000, 2)
 
         # Detect face
+        start = time.perf_counter()
         faces = detect_faces(img)
+        timings['detect_ms'] = round((time.perf_counter() - start) * 1000, 2)
         if len(faces) == 0:
             return {
                 'success': False,
@@ -129,51 +373,44 @@ def recognize_face(image_file):
                 'confidence': 0
             }
 
+        rejection = None
         for (x, y, w, h) in faces:
             face = img[y:y + h, x:x + w]
-            face = preprocess_face(face)
-            student_id, confidence = recognizer.predict(face)
 
-            # Lower confidence value means better match
-            # Threshold: confidence < 100 is acceptable (very relaxed for poor conditions)
-            print(f"🔍 Face detected - Student ID: {student_id}, Confidence: {confidence:.2f}")
-
-            if confidence < 40:
-                # Excellent match
-                return {
-                    'success': True,
-                    'message': 'Face recognized successfully with high confidence',
-                    'student_id': student_id,
-                    'confidence': round(100 - confidence, 2),
-                    'match_quality': 'High'
-                }
-            elif confidence < 70:
-                # Good match
-                return {
-                    'success': True,
-                    'message': 'Face recognized successfully',
-                    'student_id': student_id,
-                    'confidence': round(100 - confidence, 2),
-                    'match_quality': 'Medium'
-                }
-            elif confidence < 100:
-                # Acceptable match (relaxed threshold)
-                return {
-                    'success': True,
-                    'message': 'Face recognized with acceptable confidence',
-                    'student_id': student_id,
-                    'confidence': round(100 - confidence, 2),
-                    'match_quality': 'Acceptable'
-                }
-            else:
-                # Poor match
+            # Skip blurred, badly lit or tiny faces before paying for prediction
+            reason = quality_gate.check(face)
+            if reason:
+                print(f"🟡 Face rejected before prediction: {reason}")
+                rejection = rejection or reason
+                continue
+
+            start = time.perf_counter()
+            matches = match_faces([preprocess_face(face)], department)
+            elapsed = time.perf_counter() - start
+            timings['match_ms'] = round(elapsed * 1000, 2)
+            if matches is None:
                 return {
                     'success': False,
-                    'message': f'Face not recognized with sufficient confidence (confidence: {confidence:.1f}). Please ensure good lighting and clear face. Try: 1) Turn on all lights 2) Face camera directly 3) Move closer 4) Or use QR method instead.',
+                    'message': 'Model not trained. Please train the model first.',
                     'student_id': None,
-                    'confidence': round(100 - confidence, 2),
-                    'raw_confidence': confidence
+                    'confidence': 0
                 }
+            quality_gate.record_prediction(elapsed)
+
+            student_id, confidence, model_name = matches[0]
+            print(f"🔍 Face detected ({model_name}) - Student ID: {student_id}, Confidence: {confidence:.2f}")
+            result = classify_match(student_id, confidence)
+            result['model'] = model_name
+            return result
+
+        if rejection:
+            return {
+                'success': False,
+                'message': REJECTION_MESSAGES[rejection],
+                'student_id': None,
+                'confidence': 0,
+                'rejected': rejection
+            }
 
         return {
             'success': False,
@@ -192,6 +429,101 @@ def recognize_face(image_file):
         }
 
 
+def recognize_faces(image_file, department=None):
+    """
+    Recognizes every face in one image (e.g. a classroom group photo).
+    Faces are predicted in one batch (NumPy backend) or concurrently on a thread pool,
+    against the department shard first and the global model for any misses.
+    Returns dict with a per-face list of boxes, student IDs and confidences.
+    """
+    try:
+        # Group photos have small faces, so decode and detect at a higher working resolution
+        img = read_grayscale(image_file, min_side=Config.GROUP_DETECTION_MAX_SIDE)
+        faces = detect_faces(img, max_side=Config.GROUP_DETECTION_MAX_SIDE)
+        if len(faces) == 0:
+            return {
+                'success': False,
+                'message': 'No face detected in the image',
+                'faces': []
+            }
+
+        boxes = [[int(v) for v in box] for box in faces]
+        results = [None] * len(boxes)
+        crops = []
+        accepted = []
+        for i, (x, y, w, h) in enumerate(boxes):
+            # Group faces are small by nature, so only the detector's minimum size applies
+            reason = quality_gate.check(img[y:y + h, x:x + w], min_size=Config.MIN_FACE_SIZE[0])
+            if reason:
+                results[i] = {
+                    'box': boxes[i],
+                    'recognized': False,
+                    'student_id': None,
+                    'confidence': 0,
+                    'match_quality': None,
+                    'model': None,
+                    'rejected': reason
+                }
+            else:
+                crops.append(preprocess_face(img[y:y + h, x:x + w]))
+                accepted.append(i)
+
+        if crops:
+            start = time.perf_counter()
+            matches = match_faces(crops, department)
+            if matches is None:
+                return {
+                    'success': False,
+                    'message': 'Model not trained. Please train the model first.',
+                    'faces': []
+                }
+            quality_gate.record_prediction(time.perf_counter() - start, len(crops))
+
+            for i, (student_id, confidence, model_name) in zip(accepted, matches):
+                result = classify_match(student_id, confidence)
+                results[i] = {
+                    'box': boxes[i],
+                    'recognized': result['success'],
+                    'student_id': result['student_id'],
+                    'confidence': result['confidence'],
+                    'match_quality': result.get('match_quality'),
+                    'model': model_name
+                }
+
+        recognized = sum(1 for r in results if r['recognized'])
+        print(f"🔍 Group photo: {len(results)} faces detected, {recognized} recognized")
+        return {
+            'success': recognized > 0,
+            'message': f'{recognized} of {len(results)} faces recognized',
+            'faces': results
+        }
+
+    except Exception as e:
+        print(f"❌ Error in group face recognition: {e}")
+        return {
+            'success': False,
+            'message': f'Error: {str(e)}',
+            'faces': []
+        }
+
+
+def get_model_info():
+    """
+    Get load time and version of the cached recognition model and shards
+    """
+    info = recognizer_cache.info()
+    info['shards'] = shard_info()
+    info['quality_gate'] = quality_gate.stats()
+    if Config.RECOGNITION_SERVICE:
+        info['recognition_service'] = {
+            'address': Config.RECOGNITION_SERVICE,
+            'requests': recognition_client.requests,
+            'fallbacks': recognition_client.fallbacks,
+            'batching': recognition_client.stats()
+        }
+    return info
+
+
 def generate_qr_code(data, filename=None):
     """
     Generate QR code for student data
@@ -221,23 +553,18 @@ def generate_qr_code(data, filename=None):
 
 def validate_image(file):
     """
-    Validate uploaded image file
+    Validate uploaded image file (file object or bytes) from its size and
+    header, without decoding the pixels
     """
     try:
-        img = Image.open(file)
-        img.verify()
+        data = read_upload(file)
 
         # Check file size (max 5MB)
-        file.seek(0, os.SEEK_END)
-        file_size = file.tell()
-        file.seek(0)
-
-        if file_size > 5 * 1024 * 1024:  # 5MB
+        if len(data) > 5 * 1024 * 1024:  # 5MB
             return False, "File size too large. Maximum 5MB allowed."
 
         # Check image dimensions
-        img = Image.open(file)
-        width, height = img.size
+        _, width, height = image_header(data)
         if width < 100 or height < 100:
             return False, "Image resolution too low. Minimum 100x100 pixels required."
 
@@ -247,11 +574,25 @@ def validate_image(file):
         return False, f"Invalid image file: {str(e)}"
 
 
+def save_upload_image(data, filepath):
+    """
+    Store uploaded image bytes as a JPEG face image. JPEG uploads are
+    written as-is; other formats are decoded once to grayscale and encoded.
+    """
+    if image_header(data)[0] == 'JPEG':
+        with open(filepath, 'wb') as f:
+            f.write(data)
+    else:
+        cv2.imwrite(filepath, decode_grayscale(data, min_side=0))
+    return filepath
+
+
 def capture_and_save_image(file, folder_path, filename):
     """
     Save uploaded image file with validation
     """
-    is_valid, message = validate_image(file)
+    data = read_upload(file)
+    is_valid, message = validate_image(data)
     if not is_valid:
         return False, message
 
@@ -259,8 +600,6 @@ def capture_and_save_image(file, folder_path, filename):
     filepath = os.path.join(folder_path, filename)
 
     try:
-        file.seek(0)  # Reset file pointer
-        file.save(filepath)
-        return True, filepath
+        return True, save_upload_image(data, filepath)
     except Exception as e:
         return False, f"Error saving file: {str(e)}"
@@ -0,0 +1,36 @@
+import json
+import os
+import tempfile
+
+
+def read_json_stamp(path):
+    """
+    Read a small JSON stamp file.
+    Returns dict (empty if the file is missing or unreadable).
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_json_stamp(stamp, path):
+    """
+    Atomically replace a JSON stamp file: readers (in any process) see
+    either the old or the new contents, never a partial file. Each writer
+    uses its own temp file, so concurrent writers don't collide.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(stamp, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,201 @@
+import numpy as np
+from config import Config
+from utils import model_format
+
+# Upper bound on elements of one gathered (bins x train rows) chi-square block
+_BLOCK_ELEMENTS = 1 << 24
+
+
+def elbp(faces, radius=1, neighbors=8):
+    """
+    Extended (circular) local binary patterns for a stack of images.
+    Mirrors OpenCV's LBPH elbp(): bilinear neighbour interpolation in float32
+    and the same float-epsilon comparison against the centre pixel.
+    faces: uint8 array of shape (N, H, W).
+    Returns int32 array of shape (N, H - 2r, W - 2r).
+    """
+    faces = np.asarray(faces)
+    height, width = faces.shape[-2:]
+    src = faces.astype(np.float32)
+    center = src[..., radius:height - radius, radius:width - radius]
+    dst = np.zeros(center.shape, dtype=np.int32)
+    eps = np.finfo(np.float32).eps
+
+    def shifted(dy, dx):
+        return src[..., radius + dy:height - radius + dy, radius + dx:width - radius + dx]
+
+    for n in range(neighbors):
+        x = np.float32(radius * np.cos(2.0 * np.pi * n / float(neighbors)))
+        y = np.float32(-radius * np.sin(2.0 * np.pi * n / float(neighbors)))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        ty = y - np.float32(fy)
+        tx = x - np.float32(fx)
+        w1 = (np.float32(1) - tx) * (np.float32(1) - ty)
+        w2 = tx * (np.float32(1) - ty)
+        w3 = (np.float32(1) - tx) * ty
+        w4 = tx * ty
+
+        t = w1 * shifted(fy, fx) + w2 * shifted(fy, cx) + w3 * shifted(cy, fx) + w4 * shifted(cy, cx)
+        dst |= ((t > center) | (np.abs(t - center) < eps)).astype(np.int32) << n
+    return dst
+
+
+def spatial_histograms(faces, radius=1, neighbors=8, grid_x=8, grid_y=8):
+    """
+    Concatenated, per-cell normalised LBP histograms for a stack of faces,
+    laid out exactly like OpenCV's LBPH spatial_histogram().
+    Returns float32 array of shape (N, grid_x * grid_y * 2**neighbors).
+    """
+    faces = np.asarray(faces)
+    if faces.ndim == 2:
+        faces = faces[np.newaxis]
+    codes = elbp(faces, radius, neighbors)
+
+    n_faces, height, width = codes.shape
+    num_patterns = 2 ** neighbors
+    cell_w = width // grid_x
+    cell_h = height // grid_y
+    cells = grid_x * grid_y
+
+    # (N, gy, ch, gx, cw) -> (N, gy, gx, ch * cw): one row of codes per cell
+    codes = codes[:, :grid_y * cell_h, :grid_x * cell_w]
+    codes = codes.reshape(n_faces, grid_y, cell_h, grid_x, cell_w).transpose(0, 1, 3, 2, 4)
+    codes = codes.reshape(n_faces, cells, cell_h * cell_w)
+
+    # Offset each cell's codes so a single bincount builds every histogram
+    offsets = (np.arange(n_faces * cells, dtype=np.int64) * num_patterns).reshape(n_faces, cells, 1)
+    counts = np.bincount((codes + offsets).ravel(), minlength=n_faces * cells * num_patterns)
+
+    hists = counts.astype(np.float32) / np.float32(cell_h * cell_w)
+    return hists.reshape(n_faces, cells * num_patterns)
+
+
+def chi_square_distances(queries, train_t, train_sums=None, scale=1.0):
+    """
+    Alternative chi-square distance (OpenCV HISTCMP_CHISQR_ALT) between every
+    query histogram and every training histogram.
+    train_t is the bin-major (bins, N) training matrix, so the bins a query
+    actually uses can be gathered as contiguous rows. Bins where the query is
+    zero contribute exactly the training value, which comes from train_sums.
+    Quantized matrices are read back as train_t / scale.
+    Returns float64 array of shape (len(queries), N).
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    n_train = train_t.shape[1]
+    if train_sums is None:
+        train_sums = (np.asarray(train_t, dtype=np.float32) / np.float32(scale)).sum(axis=0, dtype=np.float64)
+    distances = np.empty((len(queries), n_train), dtype=np.float64)
+
+    for i, query in enumerate(queries):
+        nonzero = np.flatnonzero(query)
+        query_values = query[nonzero, np.newaxis]
+        block = max(1, _BLOCK_ELEMENTS // max(1, len(nonzero)))
+        for start in range(0, n_train, block):
+            stop = min(start + block, n_train)
+            gathered = np.asarray(train_t[nonzero, start:stop], dtype=np.float32)
+            if scale != 1.0:
+                gathered /= np.float32(scale)
+            gathered_sums = gathered.sum(axis=0, dtype=np.float64)
+
+            diff = gathered - query_values
+            np.square(diff, out=diff)
+            gathered += query_values
+            np.divide(diff, gathered, out=diff)
+            distances[i, start:stop] = 2.0 * (diff.sum(axis=0, dtype=np.float64)
+                                              + train_sums[start:stop] - gathered_sums)
+    return distances
+
+
+class NumpyLBPHRecognizer:
+    """
+    Drop-in replacement for cv2.face.LBPHFaceRecognizer backed by NumPy.
+    Training histograms live in one contiguous bin-major float32 matrix and
+    each query is matched against all of them with a vectorised chi-square.
+    """
+
+    def __init__(self, radius=1, neighbors=8, grid_x=8, grid_y=8, threshold=np.finfo(np.float64).max):
+        self.radius = radius
+        self.neighbors = neighbors
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.threshold = threshold
+        self._set_model(np.empty((grid_x * grid_y * 2 ** neighbors, 0), dtype=np.float32),
+                        np.empty(0, dtype=np.int32))
+
+    def _set_model(self, histograms_t, labels, sums=None, scale=1.0):
+        self.histograms_t = histograms_t
+        self.labels = labels
+        self.scale = scale
+        if sums is None:
+            sums = (np.asarray(histograms_t, dtype=np.float32) / np.float32(scale)).sum(axis=0, dtype=np.float64)
+        self.histogram_sums = sums
+
+    @property
+    def histograms(self):
+        """Training histograms as float32 (N, bins)"""
+        return self._float_histograms_t().T
+
+    def _float_histograms_t(self):
+        """Bin-major histograms de-quantized to float32"""
+        if self.histograms_t.dtype == np.float32 and self.scale == 1.0:
+            return self.histograms_t
+        return np.asarray(self.histograms_t, dtype=np.float32) / np.float32(self.scale)
+
+    def _histograms(self, faces):
+        if len(faces) == 0:
+            return np.empty((0, self.histograms_t.shape[0]), dtype=np.float32)
+        return spatial_histograms(np.stack([np.asarray(f) for f in faces]), self.radius,
+                                  self.neighbors, self.grid_x, self.grid_y)
+
+    def train(self, faces, labels):
+        """Replace the model with histograms of the given faces"""
+        self._set_model(np.ascontiguousarray(self._histograms(faces).T),
+                        np.asarray(labels, dtype=np.int32).ravel())
+
+    def update(self, faces, labels):
+        """Append faces to the model without recomputing existing histograms"""
+        self._set_model(np.concatenate([self._float_histograms_t(), self._histograms(faces).T], axis=1),
+                        np.concatenate([self.labels, np.asarray(labels, dtype=np.int32).ravel()]))
+
+    def predict_batch(self, faces):
+        """
+        Predict many faces at once.
+        Returns (labels, distances); label is -1 when nothing is under the threshold.
+        """
+        queries = self._histograms(faces)
+        if len(self.labels) == 0:
+            return (np.full(len(queries), -1, dtype=np.int32),
+                    np.full(len(queries), np.finfo(np.float64).max))
+
+        distances = chi_square_distances(queries, self.histograms_t, self.histogram_sums, self.scale)
+        best = distances.argmin(axis=1)
+        best_dist = distances[np.arange(len(queries)), best]
+        labels = np.where(best_dist < self.threshold, self.labels[best], -1)
+        best_dist = np.where(best_dist < self.threshold, best_dist, np.finfo(np.float64).max)
+        return labels, best_dist
+
+    def predict(self, face):
+        """Predict one face; returns (label, distance) like the OpenCV recognizer"""
+        labels, distances = self.predict_batch([face])
+        return int(labels[0]), float(distances[0])
+
+    def getHistograms(self):
+        return list(self.histograms)
+
+    def getLabels(self):
+        return self.labels.reshape(-1, 1)
+
+    def save(self, path, dtype_name=None):
+        """Save the model in the compact .lbph format (see utils.model_format)"""
+        model_format.write_model(path, self._float_histograms_t(), self.labels,
+                                 (self.radius, self.neighbors, self.grid_x, self.grid_y),
+                                 dtype_name or Config.MODEL_STORAGE_DTYPE)
+
+    def read(self, path, mmap=None):
+        """Load a model written by save(); histograms stay memory-mapped on disk if mmap"""
+        if mmap is None:
+            mmap = Config.MODEL_MMAP
+        header, labels, sums, histograms_t = model_format.read_model(path, mmap=mmap)
+        self.radius, self.neighbors, self.grid_x, self.grid_y = header['params']
+        self._set_model(histograms_t, labels, sums, header['scale'])
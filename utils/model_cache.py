@@ -0,0 +1,210 @@
+import cv2
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from config import Config
+from utils.json_stamp import read_json_stamp, write_json_stamp
+from utils.lbp_engine import NumpyLBPHRecognizer
+
+MODEL_DIR = 'recognizer'
+SHARDS_DIR = os.path.join(MODEL_DIR, 'shards')
+VERSION_FILE = 'model_version.json'
+VERSION_PATH = os.path.join(MODEL_DIR, VERSION_FILE)
+
+# Model file written by each recognition backend
+MODEL_FILES = {
+    'opencv': 'trainer.yml',
+    'numpy': 'trainer.lbph',
+}
+
+
+def get_backend(backend=None):
+    """Resolve the recognition backend name (Config.FACE_RECOGNITION_BACKEND by default)"""
+    backend = backend or Config.FACE_RECOGNITION_BACKEND
+    if backend not in MODEL_FILES:
+        raise ValueError(f"Unknown face recognition backend: {backend}")
+    return backend
+
+
+def resolve_model_path(stamp, backend=None, model_dir=MODEL_DIR):
+    """
+    Path of the model a version stamp points at. Models published through the
+    registry are referenced by the stamp's model_file; older deployments keep
+    the backend's fixed file name directly in model_dir.
+    """
+    backend = get_backend(backend)
+    model_file = stamp.get('model_file')
+    if model_file and stamp.get('backend', backend) == backend:
+        return os.path.join(model_dir, model_file)
+    return os.path.join(model_dir, MODEL_FILES[backend])
+
+
+def get_model_path(backend=None, model_dir=MODEL_DIR):
+    """Path of the current trained model file for a backend"""
+    return resolve_model_path(read_model_version(os.path.join(model_dir, VERSION_FILE)), backend, model_dir)
+
+
+def department_slug(department):
+    """Filesystem-safe name for a department shard"""
+    slug = re.sub(r'[^a-z0-9]+', '_', (department or '').strip().lower()).strip('_')
+    return slug or None
+
+
+def get_shard_dir(department):
+    """Model directory of a department shard (ValueError if the name has no usable characters)"""
+    slug = department_slug(department)
+    if slug is None:
+        raise ValueError(f"Invalid department name: {department!r}")
+    return os.path.join(SHARDS_DIR, slug)
+
+
+def create_recognizer(backend=None):
+    """Create an empty LBPH recognizer for a backend"""
+    if get_backend(backend) == 'numpy':
+        return NumpyLBPHRecognizer()
+    return cv2.face.LBPHFaceRecognizer_create()
+
+
+def read_model_version(version_path=VERSION_PATH):
+    """
+    Read the version stamp written by train_face_model.
+    Returns dict (empty if the model has never been stamped).
+    """
+    return read_json_stamp(version_path)
+
+
+def write_version_stamp(stamp, version_path=VERSION_PATH):
+    """
+    Atomically replace the version stamp. The stamp is the "current model"
+    pointer: readers see either the old or the new one, never a partial file.
+    """
+    write_json_stamp(stamp, version_path)
+
+
+class RecognizerCache:
+    """
+    Process-wide, lazily loaded LBPH recognizer.
+    The model is read from disk once and only reloaded when its generation
+    (version stamp + file mtime/size) changes, so requests share one instance
+    and a newly published or rolled back model is picked up without a restart.
+    """
+
+    def __init__(self, backend=None, model_dir=MODEL_DIR):
+        self._backend = backend
+        self.model_dir = model_dir
+        self.version_path = os.path.join(model_dir, VERSION_FILE)
+        self._lock = threading.Lock()
+        self._recognizer = None
+        self._generation = None
+        self._version = None
+        self._load_seconds = None
+        self._loaded_at = None
+        self._reloads = 0
+
+    @property
+    def backend(self):
+        return get_backend(self._backend)
+
+    @property
+    def model_path(self):
+        return get_model_path(self.backend, self.model_dir)
+
+    def _current_generation(self):
+        """Return a token identifying the model currently on disk, or None if missing"""
+        # Read the pointer once so the version and path always belong together
+        stamp = read_model_version(self.version_path)
+        model_path = resolve_model_path(stamp, self.backend, self.model_dir)
+        try:
+            stat = os.stat(model_path)
+        except OSError:
+            return None
+        if stat.st_size == 0:
+            return None
+        return stamp.get('version'), self.backend, model_path, stat.st_mtime_ns, stat.st_size
+
+    def get(self):
+        """
+        Return the shared recognizer, reloading it if the model changed.
+        Returns None if no trained model exists.
+        """
+        generation = self._current_generation()
+        if generation is None:
+            return None
+
+        # Fast path: no lock needed when the cached model is current
+        recognizer = self._recognizer
+        if recognizer is not None and generation == self._generation:
+            return recognizer
+
+        with self._lock:
+            if self._recognizer is not None and generation == self._generation:
+                return self._recognizer
+
+            start = time.perf_counter()
+            recognizer = create_recognizer(self.backend)
+            recognizer.read(generation[2])
+            elapsed = time.perf_counter() - start
+
+            self._recognizer = recognizer
+            self._generation = generation
+            self._version = generation[0]
+            self._load_seconds = elapsed
+            self._loaded_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self._reloads += 1
+            print(f"🧠 Recognizer loaded (version {self._version}) in {elapsed:.3f}s")
+            return recognizer
+
+    def invalidate(self):
+        """Drop the cached recognizer so the next call reloads from disk"""
+        with self._lock:
+            self._recognizer = None
+            self._generation = None
+
+    def info(self):
+        """Return load statistics for the cached recognizer"""
+        return {
+            'loaded': self._recognizer is not None,
+            'model_version': self._version,
+            'load_seconds': round(self._load_seconds, 4) if self._load_seconds is not None else None,
+            'loaded_at': self._loaded_at,
+            'reloads': self._reloads,
+            'backend': self.backend,
+            'model_path': self.model_path
+        }
+
+
+# Shared instance used by recognize_face
+recognizer_cache = RecognizerCache()
+
+# Per-department caches, created on first use
+_shard_caches = {}
+_shard_caches_lock = threading.Lock()
+
+
+def get_shard_cache(department):
+    """
+    Return the recognizer cache for a department shard, or None if the
+    department has no usable name or no trained shard. Only departments
+    with a shard directory are cached, so arbitrary client-supplied names
+    cannot grow the cache.
+    """
+    slug = department_slug(department)
+    if slug is None:
+        return None
+    shard_dir = os.path.join(SHARDS_DIR, slug)
+    with _shard_caches_lock:
+        if not os.path.isdir(shard_dir):
+            _shard_caches.pop(slug, None)  # shard removed by a full rebuild
+            return None
+        if slug not in _shard_caches:
+            _shard_caches[slug] = RecognizerCache(model_dir=shard_dir)
+        return _shard_caches[slug]
+
+
+def shard_info():
+    """Load statistics for every department shard used by this process"""
+    with _shard_caches_lock:
+        caches = dict(_shard_caches)
+    return {slug: cache.info() for slug, cache in caches.items()}
@@ -0,0 +1,138 @@
+"""
+Compact binary model format for the NumPy LBPH backend (.lbph).
+
+Layout (little endian, sections aligned to 64 bytes):
+    header     magic, format version, storage dtype, LBP params, sizes, scale
+    labels     int32[N]
+    sums       float64[N]        per-image histogram sums (for chi-square)
+    histograms dtype[bins, N]    bin-major, quantized training histograms
+
+Every section can be memory-mapped, so a model is usable without reading
+the whole file into RAM.
+"""
+import os
+import struct
+import numpy as np
+
+MAGIC = b'LBPHMDL1'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+# magic, version, dtype code, radius, neighbors, grid_x, grid_y, bins, N, scale
+_HEADER = struct.Struct('<8sHBxHHHHIQd')
+
+DTYPES = {
+    'float32': (1, np.float32),
+    'float16': (2, np.float16),
+    'uint8': (3, np.uint8),
+}
+_DTYPE_BY_CODE = {code: (name, dtype) for name, (code, dtype) in DTYPES.items()}
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _layout(n_train, bins, itemsize):
+    """Byte offsets of the labels, sums and histogram sections"""
+    labels_offset = _aligned(_HEADER.size)
+    sums_offset = _aligned(labels_offset + 4 * n_train)
+    hist_offset = _aligned(sums_offset + 8 * n_train)
+    end = hist_offset + itemsize * bins * n_train
+    return labels_offset, sums_offset, hist_offset, end
+
+
+def quantize(histograms_t, dtype_name):
+    """
+    Quantize float32 histograms for storage.
+    Returns (array, scale); stored values divided by scale recover the floats.
+    """
+    _, dtype = DTYPES[dtype_name]
+    if dtype_name == 'uint8':
+        peak = float(histograms_t.max()) if histograms_t.size else 0.0
+        scale = 255.0 / peak if peak > 0 else 1.0
+        return np.rint(np.asarray(histograms_t, dtype=np.float32) * np.float32(scale)).astype(np.uint8), scale
+    return np.asarray(histograms_t).astype(dtype), 1.0
+
+
+def write_model(path, histograms_t, labels, params, dtype_name='float16'):
+    """
+    Write a model to path atomically.
+    histograms_t: float32 (bins, N); labels: int (N,); params: (radius, neighbors, grid_x, grid_y)
+    """
+    if dtype_name not in DTYPES:
+        raise ValueError(f"Unsupported model storage dtype: {dtype_name}")
+    code, _ = DTYPES[dtype_name]
+    bins, n_train = histograms_t.shape
+    stored, scale = quantize(histograms_t, dtype_name)
+    # Sums of the values as they will be read back, so distances stay consistent
+    sums = (stored.astype(np.float32) / np.float32(scale)).sum(axis=0, dtype=np.float64)
+
+    labels_offset, sums_offset, hist_offset, end = _layout(n_train, bins, stored.itemsize)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, code, *(int(p) for p in params), bins, n_train, scale)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.seek(labels_offset)
+        f.write(np.asarray(labels, dtype='<i4').tobytes())
+        f.seek(sums_offset)
+        f.write(sums.astype('<f8').tobytes())
+        f.seek(hist_offset)
+        f.write(np.ascontiguousarray(stored).tobytes())
+        f.truncate(end)
+    os.replace(tmp_path, path)
+
+
+def read_header(path):
+    """Read and validate the header of a model file"""
+    with open(path, 'rb') as f:
+        raw = f.read(_HEADER.size)
+    if len(raw) < _HEADER.size:
+        raise ValueError(f"Model file too short: {path}")
+    magic, version, code, radius, neighbors, grid_x, grid_y, bins, n_train, scale = _HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError(f"Not an LBPH model file: {path}")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model format version {version}: {path}")
+    if code not in _DTYPE_BY_CODE:
+        raise ValueError(f"Unknown storage dtype code {code}: {path}")
+    return {
+        'dtype': _DTYPE_BY_CODE[code][0],
+        'params': (radius, neighbors, grid_x, grid_y),
+        'bins': bins,
+        'n_train': n_train,
+        'scale': scale,
+    }
+
+
+def read_model(path, mmap=True):
+    """
+    Open a model file.
+    Returns (header, labels, sums, histograms_t); the arrays are read-only
+    memory maps unless mmap=False.
+    """
+    header = read_header(path)
+    name = header['dtype']
+    dtype = np.dtype(DTYPES[name][1]).newbyteorder('<')
+    bins, n_train = header['bins'], header['n_train']
+    labels_offset, sums_offset, hist_offset, _ = _layout(n_train, bins, dtype.itemsize)
+
+    if n_train == 0:
+        return (header, np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64),
+                np.empty((bins, 0), dtype=dtype))
+
+    if mmap:
+        labels = np.memmap(path, dtype='<i4', mode='r', offset=labels_offset, shape=(n_train,))
+        sums = np.memmap(path, dtype='<f8', mode='r', offset=sums_offset, shape=(n_train,))
+        histograms_t = np.memmap(path, dtype=dtype, mode='r', offset=hist_offset, shape=(bins, n_train))
+        return header, labels, sums, histograms_t
+
+    with open(path, 'rb') as f:
+        f.seek(labels_offset)
+        labels = np.fromfile(f, dtype='<i4', count=n_train)
+        f.seek(sums_offset)
+        sums = np.fromfile(f, dtype='<f8', count=n_train)
+        f.seek(hist_offset)
+        histograms_t = np.fromfile(f, dtype=dtype, count=bins * n_train).reshape(bins, n_train)
+    return header, labels, sums, histograms_t
@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+from datetime import datetime
+from config import Config
+from utils.file_lock import FileLock
+from utils.model_cache import get_backend, read_model_version, write_version_stamp, \
+    MODEL_DIR, MODEL_FILES, VERSION_FILE
+
+# Versioned artifacts live in <model_dir>/registry/v0001/, v0002/, ...
+REGISTRY_DIR = 'registry'
+METADATA_FILE = 'metadata.json'
+LOCK_FILE = 'registry.lock'
+
+
+def _registry_lock(model_dir):
+    """Serialises publish, rollback and pruning across threads and processes"""
+    return FileLock(os.path.join(model_dir, LOCK_FILE))
+
+
+def _registry_path(model_dir):
+    return os.path.join(model_dir, REGISTRY_DIR)
+
+
+def _version_dir(model_dir, version):
+    return os.path.join(_registry_path(model_dir), f"v{version:04d}")
+
+
+def _read_metadata(version_dir):
+    try:
+        with open(os.path.join(version_dir, METADATA_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def list_versions(model_dir=MODEL_DIR):
+    """
+    Metadata of every published model version, oldest first, with a
+    'current' flag on the version the pointer refers to.
+    """
+    registry = _registry_path(model_dir)
+    if not os.path.isdir(registry):
+        return []
+    current = read_model_version(os.path.join(model_dir, VERSION_FILE)).get('version')
+    versions = []
+    for name in sorted(os.listdir(registry)):
+        metadata = _read_metadata(os.path.join(registry, name))
+        if metadata is None:
+            continue  # incomplete publish or foreign directory
+        metadata['current'] = metadata.get('version') == current
+        versions.append(metadata)
+    return sorted(versions, key=lambda m: m['version'])
+
+
+def publish_model(recognizer, model_dir=MODEL_DIR, **metadata):
+    """
+    Save a trained recognizer as a new registry version and atomically point
+    the version stamp at it. The artifact is complete on disk before the
+    pointer changes, so readers never see a half-written model.
+    Returns the new version number.
+    """
+    backend = get_backend()
+    with _registry_lock(model_dir):
+        current = read_model_version(os.path.join(model_dir, VERSION_FILE)).get('version', 0)
+        version = max([current] + [v['version'] for v in list_versions(model_dir)]) + 1
+        os.makedirs(_registry_path(model_dir), exist_ok=True)
+        # Claim the directory; an existing one (e.g. left by a crashed publish) is never reused
+        while True:
+            version_dir = _version_dir(model_dir, version)
+            try:
+                os.mkdir(version_dir)
+                break
+            except FileExistsError:
+                version += 1
+        recognizer.save(os.path.join(version_dir, MODEL_FILES[backend]))
+
+        stamp = {
+            'version': version,
+            'trained_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'backend': backend,
+            'model_file': os.path.relpath(os.path.join(version_dir, MODEL_FILES[backend]), model_dir)
+        }
+        stamp.update(metadata)
+        # metadata.json marks the version as complete, so it is written last
+        write_version_stamp(stamp, os.path.join(version_dir, METADATA_FILE))
+        write_version_stamp(stamp, os.path.join(model_dir, VERSION_FILE))
+        _prune_versions(model_dir)
+    return version
+
+
+def rollback_model(model_dir=MODEL_DIR, version=None):
+    """
+    Point the model back at an earlier registry version (by default the one
+    published before the current version for the active backend). Running
+    recognizers swap to it on their next request. Returns the version now current.
+    """
+    backend = get_backend()
+    with _registry_lock(model_dir):
+        versions = list_versions(model_dir)
+        current = read_model_version(os.path.join(model_dir, VERSION_FILE)).get('version')
+        if version is None:
+            older = [v for v in versions if current is not None and v['version'] < current
+                     and v.get('backend', backend) == backend]
+            if not older:
+                raise ValueError("No earlier model version to roll back to")
+            target = older[-1]
+        else:
+            target = next((v for v in versions if v['version'] == int(version)), None)
+            if target is None:
+                raise ValueError(f"Model version {version} is not in the registry")
+            if target.get('backend', backend) != backend:
+                # resolve_model_path ignores stamps of another backend
+                raise ValueError(f"Model version {version} was trained with the {target['backend']} backend, "
+                                 f"not the active {backend} backend")
+
+        if not os.path.exists(os.path.join(model_dir, target['model_file'])):
+            raise ValueError(f"Model file for version {target['version']} is missing")
+
+        stamp = {key: value for key, value in target.items() if key != 'current'}
+        stamp['rolled_back_from'] = current
+        stamp['rolled_back_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        write_version_stamp(stamp, os.path.join(model_dir, VERSION_FILE))
+    print(f"⏪ Model rolled back from version {current} to {target['version']}")
+    return target['version']
+
+
+def _prune_versions(model_dir, keep=None):
+    """Delete all but the newest keep versions, never the current one"""
+    keep = Config.MODEL_REGISTRY_KEEP if keep is None else keep
+    if keep <= 0:
+        return
+    versions = list_versions(model_dir)
+    for metadata in versions[:-keep]:
+        if not metadata['current']:
+            # A version still memory-mapped on Windows cannot be removed yet; retry next publish
+            shutil.rmtree(_version_dir(model_dir, metadata['version']), ignore_errors=True)
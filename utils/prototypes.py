@@ -0,0 +1,61 @@
+import numpy as np
+from utils.lbp_engine import spatial_histograms
+
+
+def _kmeans_medoids(features, k, iterations=10):
+    """
+    Cluster feature rows into k groups and return the index of the real
+    sample closest to each cluster centre (a medoid per cluster).
+    Deterministic: farthest-point initialisation, then Lloyd iterations.
+    """
+    first = int(np.argmin(((features - features.mean(axis=0)) ** 2).sum(axis=1)))
+    chosen = [first]
+    nearest = ((features - features[first]) ** 2).sum(axis=1)
+    while len(chosen) < k:
+        nxt = int(np.argmax(nearest))
+        chosen.append(nxt)
+        nearest = np.minimum(nearest, ((features - features[nxt]) ** 2).sum(axis=1))
+    centres = features[chosen].copy()
+
+    for _ in range(iterations):
+        distances = ((features[:, np.newaxis, :] - centres[np.newaxis, :, :]) ** 2).sum(axis=2)
+        assignment = distances.argmin(axis=1)
+        updated = np.array([features[assignment == c].mean(axis=0) if np.any(assignment == c) else centres[c]
+                            for c in range(k)])
+        if np.allclose(updated, centres):
+            break
+        centres = updated
+
+    distances = ((features[:, np.newaxis, :] - centres[np.newaxis, :, :]) ** 2).sum(axis=2)
+    medoids = []
+    for c in range(k):
+        for idx in np.argsort(distances[:, c]):
+            if idx not in medoids:
+                medoids.append(int(idx))
+                break
+    return medoids
+
+
+def select_prototypes(faces, labels, per_student):
+    """
+    Condense a training set to at most per_student representative images
+    per label. Each student's LBP histograms are clustered (square-root
+    histograms, where Euclidean distance approximates chi-square) and the
+    image nearest each cluster centre is kept.
+    Returns (faces, labels) in the original order.
+    """
+    labels = np.asarray(labels)
+    if per_student <= 0 or len(labels) == 0:
+        return list(faces), labels
+
+    keep = []
+    for label in np.unique(labels):
+        indices = np.flatnonzero(labels == label)
+        if len(indices) <= per_student:
+            keep.extend(indices.tolist())
+            continue
+        features = np.sqrt(spatial_histograms(np.stack([np.asarray(faces[i]) for i in indices])))
+        keep.extend(indices[_kmeans_medoids(features, per_student)].tolist())
+
+    keep.sort()
+    return [faces[i] for i in keep], labels[keep]
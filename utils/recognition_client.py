@@ -0,0 +1,136 @@
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+import numpy as np
+from config import Config
+
+
+def parse_service_address(address):
+    """
+    Parse Config.RECOGNITION_SERVICE: 'unix:/path/to.sock' or 'host:port'.
+    Returns (address, family) for multiprocessing.connection.
+    """
+    if address.startswith('unix:'):
+        return address[len('unix:'):], 'AF_UNIX'
+    host, _, port = address.rpartition(':')
+    return (host or 'localhost', int(port)), 'AF_INET'
+
+
+def service_authkey():
+    """Shared secret the service and its clients authenticate with"""
+    return (Config.RECOGNITION_SERVICE_AUTHKEY or Config.SECRET_KEY).encode('utf-8')
+
+
+class RecognitionClient:
+    """
+    Client for recognition_service.py. Authenticated connections are kept
+    in a small shared pool (up to max_idle), since the web server starts a
+    new thread per request and per-thread connections would redo the
+    connect and handshake every time. A connection is used by one request
+    at a time. When the service cannot be reached the client backs off for
+    retry_seconds and returns None so callers recognize in-process.
+    """
+
+    def __init__(self, address=None, timeout=None, retry_seconds=5.0, max_idle=8):
+        self._address = address
+        self._timeout = timeout
+        self.retry_seconds = retry_seconds
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._down_until = 0.0
+        self.requests = 0
+        self.fallbacks = 0
+
+    @property
+    def address(self):
+        return self._address or Config.RECOGNITION_SERVICE
+
+    @property
+    def timeout(self):
+        return Config.RECOGNITION_SERVICE_TIMEOUT if self._timeout is None else self._timeout
+
+    def _acquire(self):
+        """Take an idle connection, or open a new one. Returns (connection, reused)"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        address, family = parse_service_address(self.address)
+        return Client(address, family=family, authkey=service_authkey()), False
+
+    def _release(self, conn):
+        """Return a connection after a complete request/reply exchange"""
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        self._close(conn)
+
+    @staticmethod
+    def _close(conn):
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def _request(self, message):
+        """Send one message and wait for the reply; returns (status, payload)"""
+        while True:
+            conn, reused = None, False
+            try:
+                conn, reused = self._acquire()
+                conn.send(message)
+                if not conn.poll(self.timeout):
+                    raise TimeoutError(f"no reply within {self.timeout}s")
+                reply = conn.recv()
+            except (OSError, EOFError) as e:
+                self._close(conn)
+                if reused and not isinstance(e, TimeoutError):
+                    continue  # idle connection closed by a service restart; retry on a new one
+                raise
+            except BaseException:
+                # A late reply would be read by the next request, so the connection is dropped
+                self._close(conn)
+                raise
+            self._release(conn)
+            return reply
+
+    def match(self, crops, department=None):
+        """
+        Match preprocessed 200x200 face crops in the recognition service.
+        Returns list of (student_id, confidence, model name), or None if the
+        service is unavailable or has no trained model.
+        """
+        if not self.address or time.monotonic() < self._down_until:
+            return None
+        self.requests += 1
+        try:
+            status, payload = self._request(
+                ('match', department, [np.ascontiguousarray(crop, dtype=np.uint8) for crop in crops]))
+        except (OSError, EOFError, TimeoutError, AuthenticationError) as e:
+            self._down_until = time.monotonic() + self.retry_seconds
+            self.fallbacks += 1
+            print(f"⚠️ Recognition service unavailable ({e}), recognizing in-process")
+            return None
+
+        if status != 'ok':
+            self.fallbacks += 1
+            print(f"⚠️ Recognition service error: {payload}")
+            return None
+        return payload
+
+    def stats(self):
+        """Ask the service for its batching statistics (None if unavailable)"""
+        if not self.address:
+            return None
+        try:
+            status, payload = self._request(('stats',))
+        except (OSError, EOFError, TimeoutError, AuthenticationError):
+            return None
+        return payload if status == 'ok' else None
+
+
+# Shared client used by recognize_face / recognize_faces
+recognition_client = RecognitionClient()
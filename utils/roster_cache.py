@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from config import Config
+from db_config import get_connection
+from utils.file_lock import FileLock
+from utils.json_stamp import read_json_stamp, write_json_stamp
+
+# Bumped whenever a student is added; every worker process watches it
+GENERATION_PATH = Config.ROSTER_GENERATION_FILE
+
+ROSTER_COLUMNS = ('id', 'name', 'roll_no', 'email', 'phone', 'department', 'created_at')
+RosterEntry = namedtuple('RosterEntry', ROSTER_COLUMNS)
+
+
+class RosterCache:
+    """
+    Process-wide index of the students table (id and roll number to the
+    student's details). The roster is loaded with one query and reloaded
+    only when the shared generation file changes (a registration in any
+    worker), or after Config.ROSTER_CACHE_TTL seconds to pick up edits made
+    outside the app, so attendance and lookup paths don't query students.
+    """
+
+    def __init__(self, generation_path=GENERATION_PATH, ttl=None):
+        self.generation_path = generation_path
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._index = None  # (by_id, by_roll), swapped as a whole
+        self._token = None
+        self._generation = None
+        self._loaded_at = None
+        self._loaded_monotonic = 0.0
+        self._load_seconds = None
+        self._loads = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def ttl(self):
+        return Config.ROSTER_CACHE_TTL if self._ttl is None else self._ttl
+
+    def _current_token(self):
+        """Identify the generation file on disk (None if nothing was registered yet)"""
+        try:
+            stat = os.stat(self.generation_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, token):
+        start = time.perf_counter()
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT {', '.join(ROSTER_COLUMNS)} FROM students")
+            entries = [RosterEntry(*row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            conn.close()
+
+        # roll_no compares case-insensitively in MySQL, so the index does too
+        self._index = ({entry.id: entry for entry in entries},
+                       {entry.roll_no.lower(): entry for entry in entries})
+        self._token = token
+        self._generation = read_json_stamp(self.generation_path).get('generation', 0)
+        self._load_seconds = time.perf_counter() - start
+        self._loaded_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._loaded_monotonic = time.monotonic()
+        self._loads += 1
+        print(f"📇 Roster loaded: {len(entries)} students (generation {self._generation}) "
+              f"in {self._load_seconds * 1000:.1f} ms")
+
+    def _get_index(self):
+        """Return (by_id, by_roll), reloading if another worker changed the roster or the TTL expired"""
+        token = self._current_token()
+        index = self._index
+        if (index is not None and token == self._token
+                and not (self.ttl and time.monotonic() - self._loaded_monotonic > self.ttl)):
+            return index
+
+        with self._lock:
+            if (self._index is None or token != self._token
+                    or (self.ttl and time.monotonic() - self._loaded_monotonic > self.ttl)):
+                try:
+                    self._load(token)
+                except Exception as e:
+                    if self._index is None:
+                        raise
+                    # Keep serving the previous roster until the database is back
+                    print(f"⚠️ Roster reload failed, using the cached roster: {e}")
+                    self._loaded_monotonic = time.monotonic()
+            return self._index
+
+    def _query(self, column, value):
+        """Direct lookup used when the cache is disabled"""
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT {', '.join(ROSTER_COLUMNS)} FROM students WHERE {column} = %s", (value,))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+            conn.close()
+        return RosterEntry(*row) if row else None
+
+    def _count(self, entry):
+        with self._stats_lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def get_by_id(self, student_id):
+        """Return the RosterEntry for a students.id, or None"""
+        if not Config.ROSTER_CACHE:
+            return self._query('id', student_id)
+        try:
+            student_id = int(student_id)
+        except (TypeError, ValueError):
+            return None
+        return self._count(self._get_index()[0].get(student_id))
+
+    def get_by_roll(self, roll_no):
+        """Return the RosterEntry for a roll number (case-insensitive), or None"""
+        roll_no = str(roll_no or '').strip()
+        if not Config.ROSTER_CACHE:
+            return self._query('roll_no', roll_no) if roll_no else None
+        return self._count(self._get_index()[1].get(roll_no.lower()))
+
+    def invalidate(self):
+        """
+        Call after changing the students table: bumps the shared generation so
+        every worker (this one included) reloads on its next lookup. Never
+        raises: if the file can't be written, this worker still reloads and
+        the others catch up within the TTL.
+        """
+        with self._lock:
+            self._index = None
+            try:
+                with FileLock(f"{self.generation_path}.lock"):
+                    generation = read_json_stamp(self.generation_path).get('generation', 0) + 1
+                    write_json_stamp({'generation': generation,
+                                      'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')},
+                                     self.generation_path)
+            except Exception as e:
+                print(f"⚠️ Could not bump the roster generation: {e}")
+
+    def stats(self):
+        """Size and hit statistics of the cached roster"""
+        index = self._index
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        return {
+            'enabled': Config.ROSTER_CACHE,
+            'students': len(index[0]) if index else 0,
+            'generation': self._generation,
+            'loads': self._loads,
+            'loaded_at': self._loaded_at,
+            'load_ms': round(self._load_seconds * 1000, 2) if self._load_seconds is not None else None,
+            'hits': hits,
+            'misses': misses
+        }
+
+
+# Shared instance used by attendance marking and the Flask routes
+roster_cache = RosterCache()
@@ -0,0 +1,114 @@
+import threading
+import time
+from datetime import datetime
+from config import Config
+from train_model import train_face_model, update_face_model
+from utils.model_cache import read_model_version
+
+
+class TrainingQueue:
+    """
+    Background worker that runs model training off the request thread.
+    Jobs submitted within the coalesce window are merged into a single run:
+    any number of registrations become one incremental update, and a
+    pending full rebuild absorbs all queued updates.
+    """
+
+    def __init__(self, coalesce_seconds=None):
+        self.coalesce_seconds = (Config.TRAINING_COALESCE_SECONDS
+                                 if coalesce_seconds is None else coalesce_seconds)
+        self._cond = threading.Condition()
+        self._pending_folders = []
+        self._full_pending = False
+        self._running = False
+        self._thread = None
+
+        self._runs = 0
+        self._jobs_submitted = 0
+        self._last_kind = None
+        self._last_duration = None
+        self._last_finished = None
+        self._last_error = None
+
+    def _ensure_worker(self):
+        """Start the worker thread on first use (caller holds the lock)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='training-worker', daemon=True)
+            self._thread.start()
+
+    def submit_update(self, folder_path):
+        """Queue an incremental update for one newly registered student"""
+        with self._cond:
+            if folder_path not in self._pending_folders:
+                self._pending_folders.append(folder_path)
+            self._jobs_submitted += 1
+            self._ensure_worker()
+            self._cond.notify()
+
+    def submit_full(self):
+        """Queue a full rebuild of the model"""
+        with self._cond:
+            self._full_pending = True
+            self._jobs_submitted += 1
+            self._ensure_worker()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._full_pending and not self._pending_folders:
+                    self._cond.wait()
+
+            # Let a burst of registrations accumulate before training
+            time.sleep(self.coalesce_seconds)
+
+            with self._cond:
+                full = self._full_pending
+                folders = list(self._pending_folders)
+                self._full_pending = False
+                self._pending_folders.clear()
+                self._running = True
+
+            kind = 'full' if full else 'update'
+            print(f"🧠 Training worker: starting {kind} run"
+                  + ('' if full else f" for {len(folders)} student(s)"))
+            start = time.perf_counter()
+            error = None
+            try:
+                if full:
+                    train_face_model()
+                else:
+                    update_face_model(folders)
+            except Exception as e:
+                error = str(e)
+                print(f"❌ Training worker error: {e}")
+            duration = time.perf_counter() - start
+
+            with self._cond:
+                self._running = False
+                self._runs += 1
+                self._last_kind = kind
+                self._last_duration = duration
+                self._last_finished = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                self._last_error = error
+
+    def status(self):
+        """Return the current queue state and last run statistics"""
+        with self._cond:
+            return {
+                'queued': len(self._pending_folders) + (1 if self._full_pending else 0),
+                'queued_students': list(self._pending_folders),
+                'full_rebuild_queued': self._full_pending,
+                'running': self._running,
+                'jobs_submitted': self._jobs_submitted,
+                'runs': self._runs,
+                'last_kind': self._last_kind,
+                'last_duration': round(self._last_duration, 3) if self._last_duration is not None else None,
+                'last_finished': self._last_finished,
+                'last_error': self._last_error,
+                'model_version': read_model_version().get('version')
+            }
+
+
+# Shared instance used by the Flask routes
+training_queue = TrainingQueue()